@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+分析执行方式基准测试
+在事件循环中运行分析任务，同时以固定间隔测量事件循环的调度延迟（近似API请求的额外等待），
+对比线程池（thread）与分析进程池（process）两种执行方式
+
+用法: python benchmark_analysis_executor.py [视频] [--tasks 2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加backend路径
+backend_path = Path(__file__).parent / "video-learning-helper-backend"
+sys.path.append(str(backend_path))
+
+from app.analysis_executor import AnalysisProcessPool, build_video_analyzer
+from app.core.config import get_settings
+from app.feature_store import FrameFeatureStore
+from create_test_video import create_test_video_with_ffmpeg, create_test_video_with_opencv
+
+TASK_CONFIG = {"video_segmentation": True, "transition_detection": True}
+
+
+def prepare_clip(clips_dir: Path, duration: int = 30) -> Path:
+    """使用create_test_video.py生成测试视频"""
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    output_path = clips_dir / f"bench_clip_{duration}s.mp4"
+    if not output_path.exists():
+        if not create_test_video_with_ffmpeg(output_path, duration):
+            create_test_video_with_opencv(output_path, duration)
+    return output_path
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.01):
+    """每interval秒醒来一次，记录实际醒来时间比预期晚了多少（毫秒）"""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+    return lags
+
+
+async def run_mode(mode: str, video_path: Path, tasks: int, settings):
+    """以指定方式并发运行tasks个分析任务，返回(耗时, 调度延迟列表)"""
+    loop = asyncio.get_event_loop()
+    pool = analyzer = None
+    if mode == "process":
+        pool = AnalysisProcessPool(tasks)
+        pool.start()
+        # 等待分析进程完成导入和初始化，预热时间不计入
+        while pool.ready_workers < pool.workers:
+            await asyncio.sleep(0.1)
+    else:
+        analyzer = build_video_analyzer(settings)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    started = time.perf_counter()
+    if pool:
+        futures = [asyncio.wrap_future(pool.submit(str(video_path), TASK_CONFIG,
+                                                   f"bench_{mode}_{i}"))
+                   for i in range(tasks)]
+    else:
+        futures = [loop.run_in_executor(None, analyzer.analyze_video, str(video_path),
+                                        TASK_CONFIG, None, f"bench_{mode}_{i}")
+                   for i in range(tasks)]
+    await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+    if pool:
+        pool.close()
+    return elapsed, lags
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="分析执行方式基准测试")
+    parser.add_argument("video", nargs="?", help="样例视频（默认生成30秒测试视频）")
+    parser.add_argument("--tasks", type=int, default=2, help="并发分析任务数")
+    args = parser.parse_args()
+
+    video_path = Path(args.video) if args.video else prepare_clip(backend_path / "uploads" / "benchmark")
+    # 关闭分析缓存（分析进程继承环境变量后重新读取配置），两种方式都完整分析
+    os.environ["ENABLE_ANALYSIS_CACHE"] = "false"
+    settings = get_settings().copy(update={"enable_analysis_cache": False})
+
+    print(f"⚙️ 分析执行方式基准测试: {video_path.name}, {args.tasks} 个并发任务")
+    print("=" * 72)
+    for mode in ("thread", "process"):
+        FrameFeatureStore(video_path).delete()
+        elapsed, lags = asyncio.run(run_mode(mode, video_path, args.tasks, settings))
+        lags.sort()
+        print(f"{mode:8s} 耗时 {elapsed:6.2f}s, 事件循环延迟 p50 {statistics.median(lags):6.2f}ms, "
+              f"p99 {lags[int(len(lags) * 0.99)]:7.2f}ms, 最大 {lags[-1]:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+分析分辨率基准测试
+对比全分辨率与代理分辨率（默认320px宽）下的扫描耗时和分割/转场边界一致性
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+# 添加backend路径
+backend_path = Path(__file__).parent / "video-learning-helper-backend"
+sys.path.append(str(backend_path))
+
+from app.video_analyzer import VideoAnalyzer
+from create_test_video import create_test_video_with_ffmpeg, create_test_video_with_opencv
+
+# 边界匹配容差（秒）
+BOUNDARY_TOLERANCE = 1.0
+
+
+def prepare_clips(clips_dir: Path):
+    """使用create_test_video.py生成测试视频"""
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    clips = []
+    for filename, duration in [("bench_clip_10s.mp4", 10), ("bench_clip_30s.mp4", 30)]:
+        output_path = clips_dir / filename
+        if not output_path.exists():
+            if not create_test_video_with_ffmpeg(output_path, duration):
+                create_test_video_with_opencv(output_path, duration)
+        if output_path.exists():
+            clips.append(output_path)
+    return clips
+
+
+def run_analysis(analyzer: VideoAnalyzer, video_path: Path, analysis_width: int):
+    """在指定分析分辨率下执行一次扫描+分割+转场检测"""
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(str(video_path))
+    scan = analyzer._scan_video(cap, True, True, analysis_width=analysis_width)
+    segments = analyzer._segment_video(video_path, scan=scan)
+    transitions = analyzer._detect_transitions(video_path, scan=scan)
+    elapsed = time.perf_counter() - start
+
+    boundaries = [segment["start_time"] for segment in segments[1:]]
+    cut_times = [transition["timestamp"] for transition in transitions]
+    return elapsed, boundaries, cut_times
+
+
+def match_rate(reference, candidate):
+    """计算候选边界与参考边界的召回率和精确率"""
+    if not reference and not candidate:
+        return 1.0, 1.0
+    recalled = sum(1 for r in reference if any(abs(r - c) <= BOUNDARY_TOLERANCE for c in candidate))
+    precise = sum(1 for c in candidate if any(abs(r - c) <= BOUNDARY_TOLERANCE for r in reference))
+    recall = recalled / len(reference) if reference else 1.0
+    precision = precise / len(candidate) if candidate else 1.0
+    return recall, precision
+
+
+def main():
+    """主函数"""
+    proxy_width = int(sys.argv[1]) if len(sys.argv) > 1 else 320
+    extra_videos = [Path(p) for p in sys.argv[2:]]
+
+    clips = prepare_clips(backend_path / "uploads" / "benchmark") + extra_videos
+    if not clips:
+        print("❌ 没有可用的测试视频")
+        return
+
+    analyzer = VideoAnalyzer()
+
+    print(f"📐 分析分辨率基准测试: 全分辨率 vs {proxy_width}px")
+    print("=" * 60)
+
+    for clip in clips:
+        full_time, full_bounds, full_cuts = run_analysis(analyzer, clip, 0)
+        proxy_time, proxy_bounds, proxy_cuts = run_analysis(analyzer, clip, proxy_width)
+
+        seg_recall, seg_precision = match_rate(full_bounds, proxy_bounds)
+        cut_recall, cut_precision = match_rate(full_cuts, proxy_cuts)
+
+        print(f"\n📹 {clip.name}")
+        print(f"   耗时: 全分辨率 {full_time:.2f}s, 代理 {proxy_time:.2f}s "
+              f"(加速 {full_time / max(proxy_time, 1e-6):.1f}x)")
+        print(f"   分割边界: 全分辨率 {len(full_bounds)} 个, 代理 {len(proxy_bounds)} 个, "
+              f"召回 {seg_recall:.0%}, 精确 {seg_precision:.0%}")
+        print(f"   转场: 全分辨率 {len(full_cuts)} 个, 代理 {len(proxy_cuts)} 个, "
+              f"召回 {cut_recall:.0%}, 精确 {cut_precision:.0%}")
+
+
+if __name__ == "__main__":
+    main()
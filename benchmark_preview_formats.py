@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+片段预览格式基准测试
+对比原逐片段GIF与批量生成的GIF/WebP/MP4预览的编码耗时和每个片段的平均字节数
+"""
+
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# 添加backend路径
+backend_path = Path(__file__).parent / "video-learning-helper-backend"
+sys.path.append(str(backend_path))
+
+from app.video_analyzer import VideoAnalyzer
+from create_test_video import create_test_video_with_ffmpeg, create_test_video_with_opencv
+
+
+def prepare_clip(clips_dir: Path, duration: int = 30) -> Path:
+    """使用create_test_video.py生成测试视频"""
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    output_path = clips_dir / f"bench_clip_{duration}s.mp4"
+    if not output_path.exists():
+        if not create_test_video_with_ffmpeg(output_path, duration):
+            create_test_video_with_opencv(output_path, duration)
+    return output_path
+
+
+def legacy_gif(video_path: Path, segments, output_dir: Path):
+    """原实现：每个片段单独调用一次FFmpeg，无调色板优化"""
+    sizes = []
+    for segment in segments:
+        gif_path = output_dir / f"legacy_segment_{segment['segment_id']}.gif"
+        duration = min(segment["end_time"] - segment["start_time"], 5.0)
+        subprocess.run([
+            "ffmpeg", "-y", "-ss", str(segment["start_time"]), "-i", str(video_path),
+            "-t", str(duration), "-vf", "scale=320:-1:flags=lanczos,fps=10", "-loop", "0", str(gif_path)
+        ], capture_output=True, timeout=30)
+        if gif_path.exists():
+            sizes.append(gif_path.stat().st_size)
+    return sizes
+
+
+def batched_preview(analyzer: VideoAnalyzer, video_path: Path, segments, preview_format: str):
+    """批量生成指定格式的预览"""
+    segments = [dict(segment) for segment in segments]
+    analyzer._generate_segment_gifs(video_path, segments, f"bench_{preview_format}", preview_format)
+    return [segment["gif_size"] for segment in segments if segment.get("gif_size")]
+
+
+def main():
+    """主函数"""
+    if not shutil.which("ffmpeg"):
+        print("❌ FFmpeg不可用")
+        return
+
+    video_path = Path(sys.argv[1]) if len(sys.argv) > 1 else prepare_clip(backend_path / "uploads" / "benchmark")
+    output_dir = backend_path / "uploads" / "benchmark" / "previews"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    analyzer = VideoAnalyzer(output_dir=str(output_dir))
+    segments = analyzer._segment_video(video_path)
+    if not segments:
+        print("❌ 未识别到片段")
+        return
+
+    print(f"🎞️ 预览格式基准测试: {video_path.name}, {len(segments)} 个片段")
+    print("=" * 60)
+
+    runs = [("GIF (原逐片段)", lambda: legacy_gif(video_path, segments, output_dir))]
+    for preview_format in analyzer.preview_formats:
+        runs.append((f"{preview_format.upper()} (批量)",
+                     lambda preview_format=preview_format: batched_preview(analyzer, video_path, segments, preview_format)))
+
+    baseline = None
+    for name, run in runs:
+        start = time.perf_counter()
+        sizes = run()
+        elapsed = time.perf_counter() - start
+        if not sizes:
+            print(f"{name:16s} 生成失败")
+            continue
+
+        avg_size = sum(sizes) / len(sizes)
+        baseline = baseline or avg_size
+        print(f"{name:16s} 耗时 {elapsed:6.2f}s, 平均 {avg_size / 1024:7.1f}KB/片段 "
+              f"(原GIF的 {avg_size / baseline:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+转录后端基准测试
+对比openai-whisper与faster-whisper（CTranslate2 int8）在样例片段上的模型加载耗时和实时率（RTF = 转录耗时 / 音频时长）
+
+用法: python benchmark_transcription_backends.py [视频 ...] [--model base]
+"""
+
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# 添加backend路径
+backend_path = Path(__file__).parent / "video-learning-helper-backend"
+sys.path.append(str(backend_path))
+
+from app.transcription_backends import TRANSCRIPTION_BACKENDS, backend_available
+from app.whisper_service import SAMPLE_RATE, NoAudioStreamError, WhisperService, load_audio
+from create_test_video import create_test_video_with_ffmpeg, create_test_video_with_opencv
+
+
+def prepare_clip(clips_dir: Path, duration: int = 30) -> Path:
+    """使用create_test_video.py生成测试视频"""
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    output_path = clips_dir / f"bench_clip_{duration}s.mp4"
+    if not output_path.exists():
+        if not create_test_video_with_ffmpeg(output_path, duration):
+            create_test_video_with_opencv(output_path, duration)
+    return output_path
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="转录后端基准测试")
+    parser.add_argument("videos", nargs="*", help="样例视频（默认生成30秒测试视频）")
+    parser.add_argument("--model", default="base", help="模型大小")
+    parser.add_argument("--language", default="zh", help="转录语言")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        print("❌ FFmpeg不可用")
+        return
+
+    clips = [Path(video) for video in args.videos] or [prepare_clip(backend_path / "uploads" / "benchmark")]
+    audios = {}
+    for clip in clips:
+        try:
+            audios[clip] = load_audio(str(clip))
+        except NoAudioStreamError:
+            print(f"⚠️ {clip.name} 没有音频轨道，跳过")
+    if not audios:
+        print("❌ 没有可转录的样例")
+        return
+
+    backends = [backend for backend in TRANSCRIPTION_BACKENDS if backend_available(backend)]
+    if not backends:
+        print("❌ 没有已安装的转录后端（openai-whisper / faster-whisper）")
+        return
+
+    print(f"🎙️ 转录后端基准测试: 模型 {args.model}, {len(audios)} 个样例")
+    print("=" * 72)
+
+    for backend in backends:
+        service = WhisperService(args.model, backend=backend)
+        start = time.perf_counter()
+        service.load()
+        load_seconds = time.perf_counter() - start
+        print(f"{backend:16s} 模型加载 {load_seconds:6.2f}s")
+
+        total_audio = total_elapsed = 0.0
+        for clip, audio in audios.items():
+            duration = len(audio) / SAMPLE_RATE
+            start = time.perf_counter()
+            result = service.transcribe_chunked(audio, language=args.language)
+            elapsed = time.perf_counter() - start
+            total_audio += duration
+            total_elapsed += elapsed
+            print(f"  {clip.name:30s} 音频 {duration:6.1f}s, 转录 {elapsed:6.2f}s, "
+                  f"RTF {elapsed / duration:.3f}, {len(result['segments'])} 个片段")
+
+        print(f"  {'合计':30s} 音频 {total_audio:6.1f}s, 转录 {total_elapsed:6.2f}s, "
+              f"RTF {total_elapsed / total_audio:.3f}")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Whisper模型加载方式基准测试
+对比原来构造分析器时立即加载模型、惰性加载和独立转录进程三种方式下，
+分析器构造耗时、首次转录耗时和API进程的常驻内存（每种方式在独立子进程中测量）
+"""
+
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# 添加backend路径
+backend_path = Path(__file__).parent / "video-learning-helper-backend"
+sys.path.append(str(backend_path))
+
+SCENARIOS = ("eager", "lazy", "worker")
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存（MB，Linux下读取/proc）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_scenario(scenario: str, model_size: str, audio_path: str = None):
+    """在当前进程中执行一种加载方式并输出JSON"""
+    started = time.time()
+    from app.video_analyzer import VideoAnalyzer
+    analyzer = VideoAnalyzer(whisper_model_size=model_size, transcription_worker=scenario == "worker")
+    if scenario == "eager" and analyzer.whisper:
+        # 原实现：构造时立即加载模型
+        analyzer.whisper.load()
+    result = {"scenario": scenario, "construct_seconds": time.time() - started, "rss_after_construct_mb": rss_mb()}
+
+    if audio_path and analyzer.whisper:
+        started = time.time()
+        analyzer.whisper.transcribe(audio_path, language="zh")
+        result["first_transcription_seconds"] = time.time() - started
+        result["rss_after_transcription_mb"] = rss_mb()
+        analyzer.whisper.close()
+    print(json.dumps(result))
+
+
+def main():
+    """主函数"""
+    if len(sys.argv) > 2 and sys.argv[1] == "--scenario":
+        run_scenario(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+        return
+
+    audio_path = sys.argv[1] if len(sys.argv) > 1 else None
+    model_size = sys.argv[2] if len(sys.argv) > 2 else "base"
+
+    print("=" * 72)
+    print(f"{'方式':<10}{'构造耗时(s)':>14}{'构造后内存(MB)':>18}{'首次转录(s)':>14}{'转录后内存(MB)':>18}")
+    print("-" * 72)
+    for scenario in SCENARIOS:
+        command = [sys.executable, __file__, "--scenario", scenario, model_size] + ([audio_path] if audio_path else [])
+        output = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+        if not lines:
+            print(f"{scenario:<10} 失败: {output.stderr.strip().splitlines()[-1:] }")
+            continue
+        result = json.loads(lines[-1])
+        print(f"{scenario:<10}{result['construct_seconds']:>14.2f}{result['rss_after_construct_mb']:>18.0f}"
+              f"{result.get('first_transcription_seconds', float('nan')):>14.2f}"
+              f"{result.get('rss_after_transcription_mb', float('nan')):>18.0f}")
+    print("=" * 72)
+    print("worker方式的内存只统计API进程，模型占用的内存在独立的转录进程中")
+
+
+if __name__ == "__main__":
+    main()
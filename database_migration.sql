@@ -40,6 +40,7 @@ CREATE TABLE IF NOT EXISTS analysis_tasks (
     transition_detection BOOLEAN DEFAULT false,
     audio_transcription BOOLEAN DEFAULT false,
     report_generation BOOLEAN DEFAULT false,
+    task_options JSONB DEFAULT '{}'::jsonb,
     status VARCHAR(20) DEFAULT 'pending',
     progress VARCHAR(50) DEFAULT '0%',
     error_message TEXT,
@@ -53,6 +54,9 @@ CREATE TABLE IF NOT EXISTS analysis_tasks (
     updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- 已有的分析任务表补充可选参数列（采样模式、分段方法等，服务重启后重新排队时使用）
+ALTER TABLE analysis_tasks ADD COLUMN IF NOT EXISTS task_options JSONB DEFAULT '{}'::jsonb;
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_videos_user_id ON videos(user_id);
 CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at DESC);
@@ -3,12 +3,16 @@
 调试AI分析器的分割逻辑
 """
 
+import sys
 import cv2
 import numpy as np
 from pathlib import Path
 from sklearn.cluster import KMeans
 import logging
 
+sys.path.insert(0, 'video-learning-helper-backend')
+from app.feature_store import FrameFeatureStore
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,12 +46,20 @@ def debug_video_segmentation():
         # 每秒采样一帧进行分析
         sample_interval = max(1, int(fps))
         
+        # 分析器保存过采样帧特征时直接内存映射，无需重新解码
+        stored = FrameFeatureStore(video_path).load()
+        if stored is not None:
+            print(f"\n📂 使用已保存的采样帧特征: {FrameFeatureStore(video_path).features_path}")
+            frame_features = np.asarray(stored["features"], dtype=np.float32)
+            timestamps = stored["timestamps"].tolist()
+            sample_interval = stored["meta"].get("sample_interval", sample_interval)
+        else:
+            print(f"\n🎬 开始提取帧特征 (采样间隔: {sample_interval})")
+        
         frame_idx = 0
         processed_frames = 0
         
-        print(f"\n🎬 开始提取帧特征 (采样间隔: {sample_interval})")
-        
-        while True:
+        while stored is None:
             ret, frame = cap.read()
             if not ret:
                 break
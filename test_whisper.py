@@ -8,14 +8,14 @@ try:
     analyzer = VideoAnalyzer()
     print('✅ AI分析器创建成功')
     
-    if hasattr(analyzer, 'whisper_model') and analyzer.whisper_model:
-        print('✅ Whisper模型加载成功')
-        print(f'模型类型: {type(analyzer.whisper_model)}')
+    if analyzer.whisper:
+        # 模型在第一次转录时才加载
+        print('✅ Whisper转录服务可用')
+        print(f'转录服务状态: {analyzer.whisper.stats()}')
     else:
-        print('❌ Whisper模型未加载')
-        print(f'whisper_model属性: {getattr(analyzer, "whisper_model", "不存在")}')
+        print('❌ Whisper未安装')
         
 except Exception as e:
     print(f'❌ 测试失败: {e}')
     import traceback
-    traceback.print_exc() 
\ No newline at end of file
+    traceback.print_exc()
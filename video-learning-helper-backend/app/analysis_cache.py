@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """
+    以视频内容哈希为键的分析结果缓存
+
+    缓存键由视频内容的SHA-256、任务配置和分析器版本共同决定，任一变化都会落到新的条目。
+    每个条目是缓存目录下的一个子目录：
+    - results.json   分析结果（产物路径保持写入时的文件名）
+    - features.npz   采样帧特征和时间戳
+    - meta.json      镜头边界、来源任务ID和视频文件名（恢复时重命名产物用）
+    - artifacts/     缩略图、预览动画、字幕、脚本、报告等产物文件
+    条目先写入临时目录再整体重命名，并发写入同一个键时只保留先完成的一份。
+    除完整结果外，分析器的各个阶段（特征、片段、转场、转录等）也以同样的格式
+    各自缓存，阶段键包含其依赖阶段的键，命中统计按阶段分别计数。
+    同一个产物文件被多个条目引用（如片段阶段和完整结果）时以硬链接共享，只占一份空间。
+    缓存总大小超过max_bytes时，写入后按最近访问时间（条目目录的修改时间，命中时更新）淘汰最旧的条目，
+    一直淘汰到上限的evict_low_watermark以下。缓存总大小在内存中累计估算，只有估算值超过上限
+    或距上次扫描超过rescan_interval秒（同一目录可能被多个进程写入）时才扫描整个缓存目录。
+    """
+
+    # 内存中记忆的视频哈希和产物副本数量（按路径、大小和修改时间记忆，超出后淘汰最久未用的）
+    hash_memo_size = 256
+    artifact_memo_size = 4096
+    # 淘汰后保留的大小占上限的比例，以及两次扫描缓存目录的最长间隔（秒）
+    evict_low_watermark = 0.9
+    rescan_interval = 300
+
+    def __init__(self, cache_dir: str, version: str, max_bytes: int = 0):
+        """
+        Args:
+            cache_dir: 缓存目录
+            version: 分析器版本
+            max_bytes: 缓存总大小上限（字节），0表示不限制
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stage_stats: Dict[str, Dict[str, int]] = {}
+        self._hash_memo: "OrderedDict[tuple, str]" = OrderedDict()
+        # 已写入缓存的产物：源文件 -> 缓存中的副本（其他条目引用同一产物时硬链接到该副本）
+        self._artifact_memo: "OrderedDict[tuple, Path]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 缓存总大小的估算值（None表示尚未扫描）和上次扫描的时间
+        self._size_estimate: Optional[int] = None
+        self._last_scan = 0.0
+
+    def _file_memo_key(self, path: Path) -> tuple:
+        stat = os.stat(path)
+        return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
+
+    def _recall(self, memo: OrderedDict, memo_key: tuple):
+        with self._lock:
+            if memo_key in memo:
+                memo.move_to_end(memo_key)
+            return memo.get(memo_key)
+
+    def _remember(self, memo: OrderedDict, memo_key: tuple, value, limit: int):
+        with self._lock:
+            memo[memo_key] = value
+            memo.move_to_end(memo_key)
+            while len(memo) > limit:
+                memo.popitem(last=False)
+
+    def content_hash(self, video_path: Path) -> str:
+        """视频文件内容的SHA-256（最近用过的文件按路径、大小和修改时间记忆，不重复读取）"""
+        memo_key = self._file_memo_key(video_path)
+        content_hash = self._recall(self._hash_memo, memo_key)
+        if content_hash:
+            return content_hash
+
+        digest = hashlib.sha256()
+        with open(video_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self._remember(self._hash_memo, memo_key, digest.hexdigest(), self.hash_memo_size)
+        return digest.hexdigest()
+
+    def key(self, content_hash: str, task_config: Dict[str, Any]) -> str:
+        """由内容哈希、任务配置和分析器版本生成缓存键"""
+        payload = json.dumps({"content": content_hash, "config": task_config, "version": self.version},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self, key: str, stage: str = None) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+            stage: 阶段名称，给出时计入该阶段的命中统计，否则计入完整结果的统计
+
+        Returns:
+            {"results", "meta", "artifacts_dir", "features", "timestamps"}，未命中返回None
+        """
+        entry_dir = self.cache_dir / key
+        try:
+            # 记录访问时间（淘汰时保留最近使用的条目）
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        try:
+            with open(entry_dir / "results.json", encoding="utf-8") as f:
+                results = json.load(f)
+            with open(entry_dir / "meta.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = np.load(entry_dir / "features.npz")
+            entry = {"results": results, "meta": meta, "artifacts_dir": entry_dir / "artifacts",
+                     "features": arrays["features"], "timestamps": arrays["timestamps"]}
+        except FileNotFoundError:
+            self._count(False, stage)
+            return None
+        except Exception as e:
+            logger.warning(f"读取分析缓存失败 {key}: {e}")
+            self._count(False, stage)
+            return None
+
+        self._count(True, stage)
+        return entry
+
+    def store(self, key: str, results: Dict[str, Any], artifacts, features=None, timestamps=None,
+              meta: Dict[str, Any] = None):
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            results: 可JSON序列化的分析结果
+            artifacts: 产物文件路径列表（按文件名保存）
+            features: 采样帧特征矩阵
+            timestamps: 采样帧时间戳
+            meta: 额外元数据
+        """
+        entry_dir = self.cache_dir / key
+        if entry_dir.exists():
+            return
+
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key[:16]}_", dir=self.cache_dir))
+        saved = []
+        try:
+            artifacts_dir = tmp_dir / "artifacts"
+            artifacts_dir.mkdir()
+            for artifact in artifacts:
+                artifact = Path(artifact)
+                if artifact.exists():
+                    saved.append((self._save_artifact(artifact, artifacts_dir / artifact.name), artifact.name))
+
+            np.savez_compressed(tmp_dir / "features.npz",
+                                features=np.asarray(features if features is not None else [], dtype=np.float32),
+                                timestamps=np.asarray(timestamps if timestamps is not None else [], dtype=np.float64))
+            with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta or {}, f, ensure_ascii=False, default=str)
+            # results.json最后写入，它的存在表示条目完整
+            with open(tmp_dir / "results.json", "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, default=str)
+
+            os.rename(tmp_dir, entry_dir)
+            logger.info(f"分析结果已缓存: {key}")
+        except OSError as e:
+            # 其他任务已写入同一个键
+            logger.info(f"分析缓存条目已存在或写入失败 {key}: {e}")
+            return
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for memo_key, name in saved:
+            self._remember(self._artifact_memo, memo_key, entry_dir / "artifacts" / name, self.artifact_memo_size)
+        if self.max_bytes:
+            self._evict(keep=key, added=self._entry_new_bytes(entry_dir))
+
+    def _save_artifact(self, source: Path, target: Path) -> tuple:
+        """
+        把产物放入条目目录，返回源文件的记忆键
+
+        同一产物已在其他条目中时硬链接到那份副本，否则复制
+        （不链接输出目录中的源文件，输出文件被重新生成时会原地覆盖）。
+        """
+        memo_key = self._file_memo_key(source)
+        cached_copy = self._recall(self._artifact_memo, memo_key)
+        if cached_copy is not None:
+            try:
+                os.link(cached_copy, target)
+                return memo_key
+            except OSError:
+                # 副本已被淘汰
+                pass
+        shutil.copy2(source, target)
+        return memo_key
+
+    @staticmethod
+    def _entry_new_bytes(entry_dir: Path) -> int:
+        """条目新占用的空间（硬链接到其他条目的产物不计）"""
+        total = 0
+        for root, _, names in os.walk(entry_dir):
+            for name in names:
+                stat = os.stat(os.path.join(root, name))
+                if stat.st_nlink == 1:
+                    total += stat.st_size
+        return total
+
+    def _evict(self, keep: str, added: int = 0):
+        """
+        缓存总大小超过上限时，按最近访问时间删除最旧的条目（刚写入的keep条目除外）
+
+        Args:
+            keep: 不淘汰的条目
+            added: 本次写入新占用的字节数，累加到缓存总大小的估算值
+        """
+        if not self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._size_estimate is not None:
+                self._size_estimate += added
+                if self._size_estimate <= self.max_bytes and now - self._last_scan < self.rescan_interval:
+                    return
+            self._last_scan = now
+
+        # 硬链接共享的产物只计一次，引用它的条目全部删除后才释放空间
+        entries = []
+        file_sizes: Dict[tuple, int] = {}
+        references: Dict[tuple, int] = {}
+        for entry_dir in self.cache_dir.iterdir():
+            # 以.开头的是写入中或删除中的临时目录
+            if entry_dir.name.startswith(".") or not entry_dir.is_dir():
+                continue
+            files = set()
+            try:
+                accessed = entry_dir.stat().st_mtime
+                for root, _, names in os.walk(entry_dir):
+                    for name in names:
+                        stat = os.stat(os.path.join(root, name))
+                        files.add((stat.st_dev, stat.st_ino))
+                        file_sizes[(stat.st_dev, stat.st_ino)] = stat.st_size
+            except OSError:
+                # 条目正在被其他进程删除
+                continue
+            for file_id in files:
+                references[file_id] = references.get(file_id, 0) + 1
+            entries.append((accessed, files, entry_dir))
+        total = sum(file_sizes.values())
+        if total > self.max_bytes:
+            total = self._evict_entries(entries, file_sizes, references, total, keep)
+        with self._lock:
+            self._size_estimate = total
+
+    def _evict_entries(self, entries: list, file_sizes: Dict[tuple, int], references: Dict[tuple, int],
+                       total: int, keep: str) -> int:
+        """按最近访问时间从旧到新删除条目，直到总大小降到低水位以下，返回剩余大小"""
+        target = self.max_bytes * self.evict_low_watermark
+        for _, files, entry_dir in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            if entry_dir.name == keep:
+                continue
+            # 先整体重命名再删除，读取方要么看到完整条目，要么未命中
+            trash = self.cache_dir / f".evict_{entry_dir.name[:16]}_{os.getpid()}_{threading.get_ident()}"
+            try:
+                os.rename(entry_dir, trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            for file_id in files:
+                references[file_id] -= 1
+                if references[file_id] == 0:
+                    total -= file_sizes[file_id]
+            with self._lock:
+                self.evictions += 1
+            logger.info(f"分析缓存超过上限，已淘汰条目: {entry_dir.name}")
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "stages": {stage: dict(counts) for stage, counts in self.stage_stats.items()},
+            "cache_dir": str(self.cache_dir),
+            "max_bytes": self.max_bytes,
+        }
+
+    @staticmethod
+    def combine_stats(stats_list: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """合并多个进程（各自持有一个AnalysisCache）的命中统计，没有统计时返回None"""
+        stats_list = [stats for stats in stats_list if stats]
+        if not stats_list:
+            return None
+        combined = {"hits": 0, "misses": 0, "evictions": 0, "stages": {}}
+        for stats in stats_list:
+            for name in ("hits", "misses", "evictions"):
+                combined[name] += stats.get(name, 0)
+            for stage, counts in stats.get("stages", {}).items():
+                stage_counts = combined["stages"].setdefault(stage, {"hits": 0, "misses": 0})
+                stage_counts["hits"] += counts["hits"]
+                stage_counts["misses"] += counts["misses"]
+        total = combined["hits"] + combined["misses"]
+        combined["hit_rate"] = combined["hits"] / total if total else 0.0
+        combined["cache_dir"] = stats_list[0]["cache_dir"]
+        combined["max_bytes"] = stats_list[0].get("max_bytes", 0)
+        combined["processes"] = len(stats_list)
+        return combined
+
+    def _count(self, hit: bool, stage: str = None):
+        with self._lock:
+            if stage:
+                counts = self.stage_stats.setdefault(stage, {"hits": 0, "misses": 0})
+                counts["hits" if hit else "misses"] += 1
+            elif hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,405 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from app.analysis_cache import AnalysisCache
+from app.transcription_backends import backend_available
+from app.video_analyzer import VideoAnalyzer
+from app.whisper_service import (NoAudioStreamError, WhisperService, get_whisper_service, load_audio,
+                                 merge_chunk_results, speech_chunks)
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCancelledError(RuntimeError):
+    """分析任务已被取消（在下一次进度回调时中止）"""
+
+
+def build_video_analyzer(settings, transcription_service=None) -> VideoAnalyzer:
+    """
+    按配置创建视频分析器
+
+    Args:
+        settings: app.core.config.Settings
+        transcription_service: 使用的转录服务。分析进程中传入TranscriptionProxy，
+            转录由主进程执行，分析进程内不加载Whisper模型；默认按配置获取本进程共享的转录服务
+    """
+    analysis_cache = None
+    if settings.enable_analysis_cache:
+        analysis_cache = AnalysisCache(settings.analysis_cache_dir, VideoAnalyzer.analyzer_version,
+                                       max_bytes=settings.analysis_cache_max_bytes)
+    return VideoAnalyzer(segment_workers=settings.segment_workers,
+                         analysis_cache=analysis_cache,
+                         whisper_model_size=settings.whisper_model,
+                         transcription_worker=settings.whisper_worker_process,
+                         transcription_workers=settings.whisper_workers,
+                         transcription_backend=settings.transcription_backend,
+                         transcription_compute_type=settings.whisper_compute_type,
+                         transcription_service=transcription_service)
+
+
+def build_transcription_service(settings) -> Optional[WhisperService]:
+    """按配置获取本进程共享的转录服务（与build_video_analyzer创建的分析器共用），后端未安装时返回None"""
+    if not backend_available(settings.transcription_backend):
+        logger.warning(f"转录后端 {settings.transcription_backend} 未安装，音频转录功能不可用")
+        return None
+    return get_whisper_service(settings.whisper_model, settings.whisper_worker_process, settings.whisper_workers,
+                               settings.transcription_backend, settings.whisper_compute_type)
+
+
+class TranscriptionProxy:
+    """
+    分析进程中的转录服务代理
+
+    转录请求作为事件发给主进程，由主进程的转录服务执行：所有分析进程共用主进程中的一组模型，
+    工作进程模式下语音块仍分发给全部转录进程并行转录。音频解码和语音活动检测在分析进程中完成，
+    只把采样数组（按静音切好的语音块）发给主进程，主进程不做CPU密集的预处理。
+    接口与分析器用到的WhisperService方法一致。
+    """
+
+    def __init__(self, index: int, events, responses):
+        self._index = index
+        self._events = events
+        self._responses = responses
+        self._request_ids = itertools.count(1)
+        self.requests = 0
+
+    def transcribe(self, audio, **options) -> Dict[str, Any]:
+        if isinstance(audio, (str, os.PathLike)):
+            audio = load_audio(str(audio))
+        return self._call("transcribe", audio, options)
+
+    def transcribe_chunked(self, audio, vad=None, **options) -> Dict[str, Any]:
+        audio, chunks = speech_chunks(audio, vad)
+        results = self._call("transcribe_chunks", [audio[start:end] for start, end in chunks], options)
+        return merge_chunk_results(chunks, results, language=options.get("language"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "parent_process", "requests": self.requests}
+
+    def close(self):
+        """模型属于主进程，这里无需释放"""
+
+    def _call(self, method: str, audio, options: Dict[str, Any]):
+        """发送请求并等待主进程的结果（分析进程同一时间只处理一个任务，请求依次进行）"""
+        request_id = next(self._request_ids)
+        self.requests += 1
+        self._events.put((None, "transcribe", (self._index, request_id, method, audio, options)))
+        while True:
+            response_id, status, payload = self._responses.get()
+            if response_id == request_id:
+                break
+        if status == "ok":
+            return payload
+        raise payload
+
+
+def _analyzer_stats(analyzer: VideoAnalyzer) -> Dict[str, Any]:
+    return {
+        "analysis_cache": analyzer.analysis_cache.stats() if analyzer.analysis_cache else None,
+        "whisper": analyzer.whisper.stats() if analyzer.whisper else None,
+    }
+
+
+def _worker_main(index: int, requests, events, cancel_job, transcription_responses):
+    """
+    分析进程：启动时创建一个分析器，之后该进程处理的所有任务共用它（缓存保持加载）
+
+    进度和增量片段作为事件发回主进程，不等待主进程处理。
+    主进程把要取消的任务编号写入cancel_job，分析在下一次进度回调时中止。
+    转录请求同样作为事件发给主进程，结果从transcription_responses取回。
+    """
+    from app.core.config import get_settings
+
+    logging.basicConfig(level=logging.INFO)
+    analyzer = build_video_analyzer(get_settings(), TranscriptionProxy(index, events, transcription_responses))
+    pid = os.getpid()
+    events.put((None, "ready", pid))
+
+    # 缓存命中统计在任务进行中变化时（各阶段读取缓存之后）就发回主进程，不等任务结束
+    reported_counts = []
+
+    def report_stats():
+        cache_stats = analyzer.analysis_cache.stats() if analyzer.analysis_cache else None
+        counts = (cache_stats["hits"], cache_stats["misses"], cache_stats["evictions"],
+                  repr(cache_stats["stages"])) if cache_stats else None
+        if reported_counts and reported_counts[-1] == counts:
+            return
+        reported_counts[:] = [counts]
+        events.put((None, "stats", (pid, _analyzer_stats(analyzer))))
+
+    report_stats()
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job_id, video_path, task_config, task_id = request
+        events.put((job_id, "started", (index, pid)))
+
+        def check_cancelled():
+            if cancel_job.value == job_id:
+                raise AnalysisCancelledError("任务已取消")
+
+        def progress_callback(progress, message):
+            check_cancelled()
+            events.put((job_id, "progress", (progress, message)))
+            report_stats()
+
+        def segment_callback(segment):
+            check_cancelled()
+            events.put((job_id, "segment", segment))
+
+        try:
+            results = analyzer.analyze_video(video_path, task_config, progress_callback, task_id,
+                                             segment_callback=segment_callback)
+            events.put((job_id, "ok", results))
+        except AnalysisCancelledError as e:
+            events.put((job_id, "error", e))
+        except Exception as e:
+            events.put((job_id, "error", RuntimeError(f"{type(e).__name__}: {e}")))
+        # 转录统计等只在任务结束时发送
+        reported_counts.clear()
+        report_stats()
+
+
+class AnalysisProcessPool:
+    """
+    在独立进程中运行视频分析
+
+    视频分析的NumPy、KMeans和逐帧Python代码会长时间持有GIL，放在API进程的线程池中会拖慢请求处理。
+    进程池启动workers个分析进程（数量与API的worker数无关），每个进程持有一个常驻的VideoAnalyzer；
+    任务通过同一个队列分发，进度回调和增量片段回调通过事件队列发回，
+    由该任务自己的回调线程按顺序调用（与线程池模式下analyze_video的回调接口一致），
+    一个任务的回调（如写数据库）阻塞时不影响其他任务的事件分发。
+    取消是协作式的：分析进程在下一次进度回调时抛出AnalysisCancelledError。
+    分析进程不加载Whisper模型，音频在分析进程中解码并切成语音块后，转录请求转发给transcription_service
+    （主进程的转录服务），在单独的线程中执行后把结果发回该分析进程。
+    """
+
+    def __init__(self, workers: int = 2, transcription_service: Optional[WhisperService] = None):
+        self.workers = max(1, workers)
+        self.transcription_service = transcription_service
+        self._transcription_responses = []
+        self._processes: List[multiprocessing.Process] = []
+        self._cancel_flags = []
+        self._requests = None
+        self._events = None
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._job_ids = itertools.count(1)
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        self.ready_workers = 0
+        self.completed_jobs = 0
+        self.worker_stats: Dict[int, Dict[str, Any]] = {}
+
+    def start(self):
+        """启动分析进程（预热：进程导入依赖并创建分析器），已启动时直接返回"""
+        with self._lock:
+            if not self._processes:
+                self._start_workers()
+
+    def submit(self, video_path: str, task_config: Dict[str, Any], task_id: str,
+               progress_callback: Optional[Callable] = None,
+               segment_callback: Optional[Callable] = None) -> Future:
+        """
+        提交分析任务（首次调用时启动分析进程）
+
+        Returns:
+            完成时结果为analyze_video的返回值的Future
+        """
+        future = Future()
+        with self._lock:
+            if not self._processes:
+                self._start_workers()
+            job_id = next(self._job_ids)
+            job = {"future": future, "task_id": task_id, "pid": None, "worker": None,
+                   "job_id": job_id, "cancelled": False,
+                   "progress_callback": progress_callback,
+                   "segment_callback": segment_callback,
+                   "events": queue.Queue()}
+            self._pending[job_id] = job
+            self._requests.put((job_id, str(video_path), task_config, task_id))
+        threading.Thread(target=self._run_callbacks, args=(job,), name=f"analysis-callbacks-{job_id}",
+                         daemon=True).start()
+        return future
+
+    def cancel(self, future: Future) -> bool:
+        """
+        请求取消submit返回的任务
+
+        排队中的任务在分析进程取到时立即中止，运行中的任务在下一次进度回调时中止，
+        Future随后以AnalysisCancelledError结束。任务已结束时返回False。
+        """
+        with self._lock:
+            job = next((job for job in self._pending.values() if job["future"] is future), None)
+            if job is None:
+                return False
+            job["cancelled"] = True
+            if job["worker"] is not None:
+                self._cancel_flags[job["worker"]].value = job["job_id"]
+        return True
+
+    def close(self):
+        """停止分析进程，未完成的任务失败"""
+        with self._lock:
+            self._stop_workers()
+            pending, self._pending = self._pending, {}
+        for job in pending.values():
+            job["events"].put(("error", RuntimeError("分析进程池已关闭")))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "process",
+            "workers": self.workers,
+            "ready_workers": self.ready_workers,
+            "worker_pids": [process.pid for process in self._processes],
+            "pending_jobs": len(self._pending),
+            "running_jobs": {job["task_id"]: job["pid"] for job in list(self._pending.values()) if job["pid"]},
+            "completed_jobs": self.completed_jobs,
+            # 各分析进程（包括已退出的）的缓存命中统计之和
+            "analysis_cache": AnalysisCache.combine_stats(
+                [stats.get("analysis_cache") for stats in list(self.worker_stats.values())]),
+            "worker_stats": dict(self.worker_stats),
+        }
+
+    def _start_workers(self):
+        # spawn：子进程不继承API进程的事件循环、数据库连接和线程
+        context = multiprocessing.get_context("spawn")
+        self._requests = context.Queue()
+        self._events = context.Queue()
+        # 每个分析进程一个共享整数：要取消的任务编号（0表示无）
+        self._cancel_flags = [context.Value("q", 0, lock=False) for _ in range(self.workers)]
+        # 每个分析进程一个转录结果队列
+        self._transcription_responses = [context.Queue() for _ in range(self.workers)]
+        self._processes = [
+            context.Process(target=_worker_main, name=f"video-analysis-{i}",
+                            args=(i, self._requests, self._events, self._cancel_flags[i],
+                                  self._transcription_responses[i]), daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        self.ready_workers = 0
+        self._dispatcher = threading.Thread(target=self._dispatch,
+                                            args=(self._processes, self._events, self._transcription_responses),
+                                            name="analysis-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"视频分析进程已启动: {[p.pid for p in self._processes]}")
+
+    def _stop_workers(self):
+        """停止分析进程（调用方持有锁）"""
+        if not self._processes:
+            return
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def _transcribe(self, responses, request):
+        """执行分析进程转发的转录请求，把结果发回该进程"""
+        index, request_id, method, audio, options = request
+        if self.transcription_service is None:
+            responses[index].put((request_id, "error", RuntimeError("主进程没有可用的转录服务")))
+            return
+        try:
+            if method == "transcribe_chunks":
+                result = self.transcription_service.transcribe_chunks(audio, **options)
+            else:
+                result = self.transcription_service.transcribe(audio, **options)
+            responses[index].put((request_id, "ok", result))
+        except NoAudioStreamError as e:
+            responses[index].put((request_id, "error", e))
+        except Exception as e:
+            responses[index].put((request_id, "error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+    def _run_callbacks(self, job: Dict[str, Any]):
+        """
+        任务的回调线程：按事件顺序调用该任务的进度和片段回调，最后完成Future
+
+        结果在之前的所有回调执行完后才交给等待方，已发布的片段和进度不会晚于任务完成。
+        """
+        while True:
+            kind, payload = job["events"].get()
+            try:
+                if kind in ("progress", "segment"):
+                    if job["cancelled"] or job["future"].done():
+                        # 已请求取消的任务不再更新进度、发布片段
+                        continue
+                    if kind == "progress" and job["progress_callback"]:
+                        job["progress_callback"](*payload)
+                    elif kind == "segment" and job["segment_callback"]:
+                        job["segment_callback"](payload)
+                    continue
+                if job["future"].done():
+                    # 等待方已放弃（Future被取消）
+                    return
+                if kind == "ok":
+                    job["future"].set_result(payload)
+                else:
+                    job["future"].set_exception(payload)
+                return
+            except Exception as e:
+                logger.error(f"处理分析事件失败 {job['task_id']} ({kind}): {e}")
+                if kind not in ("progress", "segment"):
+                    return
+
+    def _dispatch(self, processes, events, transcription_responses):
+        """
+        处理分析进程发回的事件
+
+        任务的进度、片段和结果按顺序放入该任务的回调队列，由各任务的回调线程执行，
+        本线程不等待回调（回调中写数据库较慢时不会拖住其他任务）。
+        任一进程意外退出时无法得知它正在处理哪个任务，停止整组进程并让所有任务失败，
+        下一次提交时重新启动。
+        """
+        while True:
+            try:
+                job_id, kind, payload = events.get(timeout=1.0)
+            except Exception:
+                if all(process.is_alive() for process in processes):
+                    continue
+                with self._lock:
+                    if self._processes is processes:
+                        exitcodes = [process.exitcode for process in processes]
+                        self._stop_workers()
+                        pending, self._pending = self._pending, {}
+                        for job in pending.values():
+                            job["events"].put(("error", RuntimeError(f"视频分析进程已退出（exitcode={exitcodes}）")))
+                return
+
+            if kind == "ready":
+                self.ready_workers += 1
+                continue
+            if kind == "stats":
+                pid, stats = payload
+                self.worker_stats[pid] = stats
+                continue
+            if kind == "transcribe":
+                # 转录耗时较长，在单独的线程中执行，分发线程继续处理其他任务的事件
+                threading.Thread(target=self._transcribe, args=(transcription_responses, payload),
+                                 name="analysis-transcription", daemon=True).start()
+                continue
+
+            job = self._pending.get(job_id)
+            if job is None:
+                continue
+            if kind == "started":
+                with self._lock:
+                    job["worker"], job["pid"] = payload
+                    if job["cancelled"]:
+                        self._cancel_flags[job["worker"]].value = job_id
+                continue
+            if kind in ("ok", "error"):
+                with self._lock:
+                    self._pending.pop(job_id, None)
+                self.completed_jobs += 1
+            job["events"].put((kind, payload))
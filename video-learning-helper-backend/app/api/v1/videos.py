@@ -11,6 +11,7 @@ import json
 from app.database_supabase import get_db
 from app.core.security import decode_access_token
 from app.crud.video import video_crud, analysis_task_crud
+from app.feature_store import FrameFeatureStore
 from app.schemas.video import (
     VideoResponse, VideoCreate, VideoUpdate, 
     AnalysisTaskResponse, AnalysisTaskCreate, AnalysisTaskUpdate,
@@ -171,6 +172,7 @@ async def delete_video(
         file_path = UPLOAD_DIR / f"{video_id}{Path(video.filename).suffix}"
         if file_path.exists():
             file_path.unlink()
+        FrameFeatureStore(file_path).delete()
     except Exception as e:
         print(f"删除文件失败: {e}")
     
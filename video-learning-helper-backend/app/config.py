@@ -48,10 +48,25 @@ class Settings:
     
     # 任务处理配置
     MAX_CONCURRENT_TASKS: int = int(os.getenv("MAX_CONCURRENT_TASKS", "2"))
+    SEGMENT_WORKERS: int = int(os.getenv("SEGMENT_WORKERS", "4"))  # 单个任务内片段后处理的线程数
+    ANALYSIS_EXECUTOR: str = os.getenv("ANALYSIS_EXECUTOR", "process")  # thread / process
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "2"))  # 分析进程数量（process模式）
     TASK_TIMEOUT: int = int(os.getenv("TASK_TIMEOUT", "3600"))  # 1小时
+    TASK_QUEUE_BACKEND: str = os.getenv("TASK_QUEUE_BACKEND", "sqlite")  # sqlite / memory
+    TASK_QUEUE_PATH: Path = Path(os.getenv("TASK_QUEUE_PATH", "data/task_queue.sqlite3"))  # 不要放在公开挂载的uploads/下
+    TASK_LEASE_SECONDS: int = int(os.getenv("TASK_LEASE_SECONDS", "60"))  # 租约时长（秒）
+    TASK_MAX_ATTEMPTS: int = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))  # 任务被中断后的最多执行次数
     
     # 视频分析配置
     ENABLE_REAL_ANALYSIS: bool = os.getenv("ENABLE_REAL_ANALYSIS", "true").lower() == "true"
+    ENABLE_ANALYSIS_CACHE: bool = os.getenv("ENABLE_ANALYSIS_CACHE", "true").lower() == "true"
+    ANALYSIS_CACHE_DIR: Path = Path(os.getenv("ANALYSIS_CACHE_DIR", "data/analysis_cache"))  # 不要放在公开挂载的uploads/下
+    ANALYSIS_CACHE_MAX_BYTES: int = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))  # 0表示不限制
+    TRANSCRIPTION_BACKEND: str = os.getenv("TRANSCRIPTION_BACKEND", "whisper")  # whisper / faster-whisper
+    WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "base")  # tiny/base/small/medium/large
+    WHISPER_COMPUTE_TYPE: Optional[str] = os.getenv("WHISPER_COMPUTE_TYPE")  # faster-whisper默认int8
+    WHISPER_WORKER_PROCESS: bool = os.getenv("WHISPER_WORKER_PROCESS", "true").lower() == "true"  # 模型加载到独立的转录进程（false时模型在本进程中，语音块按顺序转录）
+    WHISPER_WORKERS: int = int(os.getenv("WHISPER_WORKERS", "2"))  # 转录进程数量（每个进程一个模型，语音块在各进程间并行转录）
     FFMPEG_PATH: Optional[str] = os.getenv("FFMPEG_PATH")
     
     # 热更新配置
@@ -71,11 +71,26 @@ class Settings(BaseSettings):
     
     # 任务处理配置
     max_concurrent_tasks: int = Field(default=2, env="MAX_CONCURRENT_TASKS")
+    segment_workers: int = Field(default=4, env="SEGMENT_WORKERS")  # 单个任务内片段后处理的线程数
+    analysis_executor: Literal["thread", "process"] = Field(default="process", env="ANALYSIS_EXECUTOR")  # 分析在API进程的线程池或独立进程中运行
+    analysis_workers: int = Field(default=2, env="ANALYSIS_WORKERS")  # 分析进程数量（process模式）
     task_timeout: int = Field(default=3600, env="TASK_TIMEOUT")
+    task_queue_backend: Literal["sqlite", "memory"] = Field(default="sqlite", env="TASK_QUEUE_BACKEND")  # 持久化任务队列
+    task_queue_path: Path = Field(default=Path("data/task_queue.sqlite3"), env="TASK_QUEUE_PATH")  # 不要放在公开挂载的uploads/下
+    task_lease_seconds: int = Field(default=60, env="TASK_LEASE_SECONDS")  # 租约时长，持有者退出后任务在此时间后重新可见
+    task_max_attempts: int = Field(default=3, env="TASK_MAX_ATTEMPTS")  # 任务被中断后的最多执行次数
     
     # 视频分析配置
     enable_real_analysis: bool = Field(default=True, env="ENABLE_REAL_ANALYSIS")
     ffmpeg_path: Optional[str] = Field(default=None, env="FFMPEG_PATH")
+    enable_analysis_cache: bool = Field(default=True, env="ENABLE_ANALYSIS_CACHE")
+    analysis_cache_dir: Path = Field(default=Path("data/analysis_cache"), env="ANALYSIS_CACHE_DIR")  # 不要放在公开挂载的uploads/下
+    analysis_cache_max_bytes: int = Field(default=10 * 1024 ** 3, env="ANALYSIS_CACHE_MAX_BYTES")  # 缓存总大小上限，超出后淘汰最久未用的条目，0表示不限制
+    transcription_backend: Literal["whisper", "faster-whisper"] = Field(default="whisper", env="TRANSCRIPTION_BACKEND")
+    whisper_model: str = Field(default="base", env="WHISPER_MODEL")  # tiny/base/small/medium/large
+    whisper_compute_type: Optional[str] = Field(default=None, env="WHISPER_COMPUTE_TYPE")  # faster-whisper默认int8
+    whisper_worker_process: bool = Field(default=True, env="WHISPER_WORKER_PROCESS")  # 模型加载到独立的转录进程（false时模型在本进程中，语音块按顺序转录）
+    whisper_workers: int = Field(default=2, env="WHISPER_WORKERS")  # 转录进程数量（每个进程一个模型，语音块在各进程间并行转录）
     
     @property
     def supabase_url(self) -> str:
@@ -220,6 +220,7 @@ class DatabaseManager:
             "transition_detection": task_data.get("transition_detection", False),
             "audio_transcription": task_data.get("audio_transcription", False),
             "report_generation": task_data.get("report_generation", False),
+            "task_options": task_data.get("task_options") or {},
             "status": "pending",
             "progress": "0",
             "created_at": datetime.utcnow().isoformat(),
@@ -241,6 +242,14 @@ class DatabaseManager:
                 print(f"⚠️ RLS blocked Supabase insertion, using memory storage for task: {task_record['id']}")
                 _task_storage[task_record['id']] = task_record
                 return task_record
+            elif "task_options" in error_msg:
+                # 数据库尚未执行迁移（没有task_options列），不保存可选参数
+                print(f"⚠️ analysis_tasks has no task_options column, run database_migration.sql: {e}")
+                task_record.pop("task_options")
+                result = self.client.table("analysis_tasks").insert(task_record).execute()
+                if result.data:
+                    return result.data[0]
+                raise Exception(f"Supabase insert failed: {result}")
             else:
                 raise Exception(f"Failed to create analysis task: {e}")
     
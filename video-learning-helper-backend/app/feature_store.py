@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameFeatureStore:
+    """
+    与上传视频放在一起的采样帧特征文件
+
+    视频 uploads/<id>.mp4 对应三个文件：
+    - <id>.features.npy     采样帧HSV直方图特征，float16，形状 (N, 150)，可内存映射
+    - <id>.timestamps.npy   采样帧时间戳（秒），float64，形状 (N,)
+    - <id>.features.json    元数据：特征维度、采样间隔、分析宽度和写入时视频的大小/修改时间
+    元数据最后写入，它的存在表示特征完整；视频被替换（大小或修改时间变化）后特征失效。
+    重新分割、相似片段检索和调试脚本可以直接内存映射特征，无需重新解码视频。
+    """
+
+    version = 1
+
+    def __init__(self, video_path):
+        video_path = Path(video_path)
+        self.video_path = video_path
+        self.features_path = video_path.with_suffix(".features.npy")
+        self.timestamps_path = video_path.with_suffix(".timestamps.npy")
+        self.meta_path = video_path.with_suffix(".features.json")
+
+    def exists(self) -> bool:
+        return self.meta_path.exists()
+
+    def save(self, features, timestamps, **params):
+        """
+        写入特征和时间戳
+
+        Args:
+            features: 采样帧特征（N个等长向量）
+            timestamps: 采样帧时间戳
+            params: 需要与读取参数匹配的提取参数（如analysis_width、sample_interval）
+        """
+        features = np.asarray(features, dtype=np.float16)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if features.ndim != 2 or len(features) != len(timestamps):
+            raise ValueError(f"特征与时间戳数量不一致: {features.shape} / {timestamps.shape}")
+
+        stat = os.stat(self.video_path)
+        meta = {"version": self.version, "count": len(features), "dim": features.shape[1],
+                "video_size": stat.st_size, "video_mtime_ns": stat.st_mtime_ns, **params}
+
+        # 先删除旧的元数据，写入过程中中断不会留下看似完整的特征
+        self.meta_path.unlink(missing_ok=True)
+        for path, array in ((self.features_path, features), (self.timestamps_path, timestamps)):
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        tmp_meta = self.meta_path.with_name(f".{self.meta_path.name}.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_path)
+        logger.info(f"采样帧特征已保存: {self.features_path} ({len(features)} x {features.shape[1]})")
+
+    def load(self, mmap_mode: Optional[str] = "r", **params) -> Optional[Dict[str, Any]]:
+        """
+        读取特征
+
+        Args:
+            mmap_mode: np.load的内存映射模式，None表示读入内存
+            params: 要求与写入时一致的提取参数
+
+        Returns:
+            {"features", "timestamps", "meta"}，不存在、已失效或参数不一致时返回None
+        """
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            stat = os.stat(self.video_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取采样帧特征元数据失败 {self.meta_path}: {e}")
+            return None
+
+        if meta.get("version") != self.version:
+            return None
+        if meta.get("video_size") != stat.st_size or meta.get("video_mtime_ns") != stat.st_mtime_ns:
+            logger.info(f"视频已变化，采样帧特征失效: {self.features_path}")
+            return None
+        if any(meta.get(name) != value for name, value in params.items()):
+            return None
+
+        try:
+            features = np.load(self.features_path, mmap_mode=mmap_mode)
+            timestamps = np.load(self.timestamps_path, mmap_mode=mmap_mode)
+        except Exception as e:
+            logger.warning(f"读取采样帧特征失败 {self.features_path}: {e}")
+            return None
+        if features.shape != (meta["count"], meta["dim"]) or len(timestamps) != meta["count"]:
+            return None
+        return {"features": features, "timestamps": timestamps, "meta": meta}
+
+    def delete(self):
+        """删除特征文件（视频被删除时调用）"""
+        for path in (self.meta_path, self.features_path, self.timestamps_path):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,141 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Union
+
+import cv2
+import numpy as np
+
+
+class SampleFrameBuffer:
+    """
+    按采样序号保存代表帧/缩略图帧的有界缓冲区
+
+    超出容量时按步长抽稀（步长翻倍，只保留序号能被步长整除的帧），
+    因此任意长度的视频都只占用固定数量的帧内存。最近的若干帧和被固定（pin）的帧
+    不参与抽稀，保证边界确认后仍能取到准确的起始帧；查询不到的序号返回片段区间内最近的已保留帧。
+    固定的帧不计入容量。扫描结束后才产出片段时固定的帧会一直累积（每个镜头边界一帧），
+    encode_pinned为True时它们移出最近窗口后以JPEG保存，读取时再解码。
+    """
+
+    def __init__(self, capacity: int = 120, keep_recent: int = 4, encode_pinned: bool = False):
+        self.capacity = max(2, capacity)
+        self.keep_recent = keep_recent
+        self.encode_pinned = encode_pinned
+        self.stride = 1
+        self._frames: Dict[int, Union[np.ndarray, bytes]] = {}
+        self._pinned = set()
+        self._latest = -1
+
+    def add(self, index: int, frame: np.ndarray):
+        """保存一帧，必要时抽稀"""
+        self._frames[index] = frame
+        self._latest = max(self._latest, index)
+
+        # 移出最近窗口且不满足步长的帧
+        expired = self._latest - self.keep_recent
+        if expired in self._frames:
+            if not self._retained(expired):
+                del self._frames[expired]
+            elif expired in self._pinned:
+                self._encode(expired)
+
+        # 步长超过最新序号后抽稀已无法再减少帧数（只剩固定帧、最近帧和序号0）
+        while len(self._frames) - len(self._pinned.intersection(self._frames)) > self.capacity \
+                and self.stride <= self._latest:
+            self.stride *= 2
+            self._frames = {i: f for i, f in self._frames.items() if self._retained(i)}
+
+    def pin(self, index: int):
+        """固定某个序号的帧（如当前片段的起始帧，可以是尚未加入的帧），抽稀时保留"""
+        self._pinned.add(index)
+        if index in self._frames and index <= self._latest - self.keep_recent:
+            self._encode(index)
+
+    def release_before(self, index: int):
+        """释放序号小于index的所有帧（对应的片段已经产出）"""
+        self._frames = {i: f for i, f in self._frames.items() if i >= index}
+        self._pinned = {i for i in self._pinned if i >= index}
+
+    def get(self, index: int, start: Optional[int] = None, end: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        获取指定序号的帧，不存在时返回 [start, end] 内最近的已保留帧
+
+        抽稀后最近的已保留帧可能属于相邻片段，因此只在给定区间内查找，区间内没有保留帧时返回None。
+        """
+        if index in self._frames:
+            return self._decode(self._frames[index])
+        start = index if start is None else start
+        end = index if end is None else end
+
+        keys = sorted(self._frames)
+        pos = bisect_left(keys, index)
+        candidates = [i for i in keys[max(0, pos - 1):pos + 1] if start <= i <= end]
+        if not candidates:
+            return None
+        nearest = min(candidates, key=lambda i: abs(i - index))
+        return self._decode(self._frames[nearest])
+
+    def _encode(self, index: int):
+        """把移出最近窗口的固定帧改为JPEG保存"""
+        frame = self._frames[index]
+        if self.encode_pinned and isinstance(frame, np.ndarray):
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            if ok:
+                self._frames[index] = data.tobytes()
+
+    @staticmethod
+    def _decode(frame: Union[np.ndarray, bytes]) -> np.ndarray:
+        if isinstance(frame, bytes):
+            return cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+        return frame
+
+    def _retained(self, index: int) -> bool:
+        """抽稀时是否保留该帧"""
+        return (index % self.stride == 0 or index in self._pinned
+                or index > self._latest - self.keep_recent)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class SeekingSampleFrames:
+    """
+    按采样序号直接定位读取采样帧
+
+    采样特征来自缓存、扫描时没有保留采样帧时使用，接口与SampleFrameBuffer.get一致。
+    采样序号i对应视频第 i * sample_interval 帧；只读取被请求的帧，最近读取的帧会被记住。
+    """
+
+    def __init__(self, video_path: str, sample_interval: int,
+                 transform: Optional[Callable[[np.ndarray], np.ndarray]] = None, memo_size: int = 8):
+        self.video_path = str(video_path)
+        self.sample_interval = sample_interval
+        self.transform = transform
+        self.memo_size = memo_size
+        self._cap = None
+        self._frames: Dict[int, Optional[np.ndarray]] = {}
+
+    def get(self, index: int, start: Optional[int] = None, end: Optional[int] = None) -> Optional[np.ndarray]:
+        """读取指定采样序号的帧（总是精确定位，start/end仅为与SampleFrameBuffer.get保持一致），读取失败返回None"""
+        if index in self._frames:
+            return self._frames[index]
+
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, index * self.sample_interval)
+        ret, frame = self._cap.read()
+        frame = (self.transform(frame) if self.transform else frame) if ret else None
+
+        if len(self._frames) >= self.memo_size:
+            self._frames.pop(next(iter(self._frames)))
+        self._frames[index] = frame
+        return frame
+
+    def close(self):
+        """释放捕获对象"""
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._frames.clear()
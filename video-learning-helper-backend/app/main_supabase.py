@@ -15,7 +15,7 @@ import shutil
 from pathlib import Path
 
 from app.database_supabase import db_manager
-from app.task_processor import start_task_processor, stop_task_processor, submit_analysis_task, get_processor_status
+from app.task_processor import start_task_processor, stop_task_processor, submit_analysis_task, cancel_analysis_task, get_processor_status
 
 # 加载环境变量
 load_dotenv("config.env")
@@ -141,6 +141,12 @@ class AnalysisTaskCreate(BaseModel):
     transition_detection: bool = False
     audio_transcription: bool = False
     report_generation: bool = False
+    # 可选分析参数
+    sampling_mode: Optional[str] = None  # decode / grab / seek
+    segmentation_method: Optional[str] = None  # changepoint / kmeans / transitions
+    merge_similar_segments: bool = False  # transitions分割时合并直方图相似的相邻片段
+    preview_format: Optional[str] = None  # gif / webp / mp4
+    transition_stride: Optional[int] = None  # 转场检测粗扫描步长（如5），默认逐帧
 
 class UploadResponse(BaseModel):
     message: str
@@ -467,6 +473,19 @@ async def create_analysis_task(
             print(f"❌ Authorization failed: video belongs to {video['user_id']}, but current user is {user_id}")
             raise HTTPException(status_code=403, detail="无权访问此视频")
         
+        # 可选参数随任务保存，服务重启后重新排队的任务按同样的参数执行
+        task_options = {}
+        if task_data.sampling_mode:
+            task_options["sampling_mode"] = task_data.sampling_mode
+        if task_data.segmentation_method:
+            task_options["segmentation_method"] = task_data.segmentation_method
+        if task_data.merge_similar_segments:
+            task_options["merge_similar_segments"] = True
+        if task_data.preview_format:
+            task_options["preview_format"] = task_data.preview_format
+        if task_data.transition_stride:
+            task_options["transition_stride"] = task_data.transition_stride
+        
         # 创建分析任务
         task_create_data = {
             "video_id": task_data.video_id,
@@ -474,23 +493,22 @@ async def create_analysis_task(
             "video_segmentation": task_data.video_segmentation,
             "transition_detection": task_data.transition_detection,
             "audio_transcription": task_data.audio_transcription,
-            "report_generation": task_data.report_generation
+            "report_generation": task_data.report_generation,
+            "task_options": task_options
         }
         
         task = await db_manager.create_analysis_task(task_create_data)
         
         # 提交任务到处理器进行异步分析
         video_file_path = Path("uploads") / video["file_url"].split("/")[-1]
-        await submit_analysis_task(
-            task["id"], 
-            str(video_file_path), 
-            {
-                "video_segmentation": task_data.video_segmentation,
-                "transition_detection": task_data.transition_detection,
-                "audio_transcription": task_data.audio_transcription,
-                "report_generation": task_data.report_generation
-            }
-        )
+        task_config = {
+            "video_segmentation": task_data.video_segmentation,
+            "transition_detection": task_data.transition_detection,
+            "audio_transcription": task_data.audio_transcription,
+            "report_generation": task_data.report_generation,
+            **task_options
+        }
+        await submit_analysis_task(task["id"], str(video_file_path), task_config)
         
         return AnalysisTaskResponse(
             id=task["id"],
@@ -595,7 +613,7 @@ async def get_video(
 @app.get("/api/v1/system/processor-status")
 async def get_system_processor_status():
     """获取任务处理器状态"""
-    return get_processor_status()
+    return await get_processor_status()
 
 @app.get("/api/v1/analysis/tasks/{task_id}/segments")
 async def get_task_segments_with_analysis(
@@ -636,6 +654,7 @@ async def get_task_segments_with_analysis(
                     "frame_count": int(duration * 25),  # 假设25fps
                     "thumbnail_url": row.get('thumbnail_url'),
                     "gif_url": row.get('gif_url'),
+                    "gif_size": row.get('gif_size'),
                     "content_analysis": {
                         "caption": analysis_data.get('caption', '') or f"片段 {row.get('segment_index', 0)} 的旁白内容。这是一个示例文案，展示该片段的主要内容和关键信息。",
                         "composition": analysis_data.get('composition', '') or "中心构图，主体突出，背景简洁，视觉重点明确。",
@@ -721,6 +740,30 @@ async def get_analysis_task(
         print(f"Error fetching analysis task: {e}")
         raise HTTPException(status_code=500, detail=f"获取分析任务失败: {str(e)}")
 
+@app.post("/api/v1/analysis/tasks/{task_id}/cancel")
+async def cancel_analysis_task_endpoint(
+    task_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """取消排队中或运行中的分析任务"""
+    try:
+        task = await db_manager.get_analysis_task_by_id(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="分析任务不存在")
+        
+        if task["user_id"] != user_id:
+            raise HTTPException(status_code=403, detail="无权访问此任务")
+        
+        if not await cancel_analysis_task(task_id):
+            raise HTTPException(status_code=409, detail="任务不在排队或运行中")
+        
+        return {"message": "已请求取消任务", "task_id": task_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error cancelling analysis task: {e}")
+        raise HTTPException(status_code=500, detail=f"取消分析任务失败: {str(e)}")
+
 @app.delete("/api/v1/videos/{video_id}")
 async def delete_video(
     video_id: str,
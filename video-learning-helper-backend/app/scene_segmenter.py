@@ -0,0 +1,96 @@
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+
+class ChangePointSegmenter:
+    """
+    流式场景变化点检测器
+
+    逐个接收采样帧的直方图特征，将其与当前场景最近若干帧的平均直方图比较。
+    距离超过阈值并在随后的确认帧中持续保持时，确认一个场景边界。
+    每个特征只处理一次，内存只保留固定长度的窗口，整体为 O(N)。
+    """
+
+    def __init__(self, threshold: float = 0.2, window_size: int = 10,
+                 min_segment_length: int = 2, confirm_length: int = 2):
+        """
+        Args:
+            threshold: 直方图距离阈值（0-1，按各通道L1距离的一半取平均）
+            window_size: 当前场景参考窗口的采样帧数量
+            min_segment_length: 场景最少包含的采样帧数量
+            confirm_length: 确认边界所需的连续偏离采样帧数量（抑制闪光等单帧突变）
+        """
+        self.threshold = threshold
+        self.window_size = window_size
+        self.min_segment_length = min_segment_length
+        self.confirm_length = max(1, confirm_length)
+
+        self.boundaries: List[int] = [0]
+        self._window = deque(maxlen=window_size)
+        self._window_sum = None
+        self._candidates = []  # 待确认的 (采样序号, 特征)
+        self._index = 0
+
+    def update(self, feature: np.ndarray) -> Optional[int]:
+        """
+        输入下一个采样帧的特征
+
+        Returns:
+            若本次确认了新的场景边界，返回边界所在的采样序号，否则返回None
+        """
+        feature = np.asarray(feature, dtype=np.float64)
+        index = self._index
+        self._index += 1
+
+        if not self._window:
+            self._push(feature)
+            return None
+
+        distance = self.distance(feature, self._window_sum / len(self._window))
+        segment_length = index - self.boundaries[-1]
+
+        if distance > self.threshold and (self._candidates or segment_length >= self.min_segment_length):
+            self._candidates.append((index, feature))
+            if len(self._candidates) >= self.confirm_length:
+                boundary = self._candidates[0][0]
+                self.boundaries.append(boundary)
+
+                # 新场景以候选帧重新建立参考窗口
+                self._window.clear()
+                self._window_sum = None
+                for _, candidate_feature in self._candidates:
+                    self._push(candidate_feature)
+                self._candidates = []
+                return boundary
+            return None
+
+        # 偏离未能持续，候选帧仍归属当前场景
+        for _, candidate_feature in self._candidates:
+            self._push(candidate_feature)
+        self._candidates = []
+        self._push(feature)
+        return None
+
+    def finish(self) -> List[int]:
+        """结束输入，返回所有场景起点的采样序号（第一个总是0）"""
+        self._candidates = []
+        return list(self.boundaries)
+
+    @property
+    def sample_count(self) -> int:
+        """已输入的采样帧数量"""
+        return self._index
+
+    @staticmethod
+    def distance(feature: np.ndarray, reference: np.ndarray) -> float:
+        """两个H/S/V拼接直方图之间的距离（0表示相同，1表示完全不重叠）"""
+        return float(np.abs(feature - reference).sum() / 6.0)
+
+    def _push(self, feature: np.ndarray):
+        """将特征加入参考窗口，增量维护窗口和"""
+        if len(self._window) == self._window.maxlen:
+            self._window_sum -= self._window[0]
+        self._window.append(feature)
+        self._window_sum = feature.copy() if self._window_sum is None else self._window_sum + feature
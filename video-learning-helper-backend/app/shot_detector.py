@@ -0,0 +1,206 @@
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class ShotBoundaryDetector:
+    """
+    流式镜头边界检测器
+
+    逐帧接收灰度直方图差异和边缘变化率（ECR），两者加权得到帧间变化分数，
+    并与最近若干帧分数的中位数/MAD（中位数绝对偏差）构成的自适应阈值比较。
+    每一帧的分数都进入统计窗口：镜头运动、压缩噪声抬高了分数基线时阈值随之抬高，
+    而少数突变帧几乎不影响中位数和MAD；进行中的候选渐变沿用开始时的低阈值，
+    持续的镜头运动在候选超过最大渐变长度后被丢弃，此时窗口已适应新的基线。
+    确认为渐变的帧从窗口中移除，紧随其后的转场（如淡出后淡入）不受其影响。
+    - 分数超过高阈值且下一帧明显回落（孤立突变）：硬切，因此硬切延迟一帧确认。
+      硬切发生时若有进行中的候选渐变，候选在切点前结束（此时要求直方图差异同样孤立突变）
+    - 分数连续若干帧超过低阈值（双阈值比较法）：候选渐变，结束时比较候选起止帧的
+      直方图，累计变化足够大才确认为叠化；经过接近全黑的帧时判为淡入淡出。
+      持续的高分（如淡入淡出中的大幅亮度变化）并入候选渐变，单帧闪光因过短被忽略
+    窗口大小固定，每帧的运算量与视频长度无关，整体为 O(N)。
+    """
+
+    def __init__(self, window_size: int = 30, min_history: int = 5, histogram_weight: float = 0.5,
+                 cut_sigma: float = 4.0, min_cut_score: float = 0.35, cut_ratio: float = 1.5,
+                 cut_isolation: float = 0.5,
+                 gradual_sigma: float = 1.5, min_gradual_score: float = 0.08,
+                 gradual_threshold: float = 0.4, min_gradual_length: int = 3,
+                 max_gradual_length: int = 90, max_gradual_gap: int = 1, dark_level: float = 20.0):
+        """
+        Args:
+            window_size: 自适应阈值统计窗口的帧数量
+            min_history: 窗口帧数不足时只使用最低阈值
+            histogram_weight: 直方图差异的权重（其余为边缘变化率）
+            cut_sigma: 硬切阈值 = 中位数 + cut_sigma * 1.4826 * MAD（MAD换算为正态分布的标准差）
+            min_cut_score: 硬切分数的最低阈值
+            cut_ratio: 硬切分数至少为窗口中位数的该倍数（匀速运动时分数平稳、MAD很小，阈值不能只靠MAD）
+            cut_isolation: 下一帧分数高出中位数的部分低于硬切分数高出部分的该比例时才确认硬切
+            gradual_sigma: 渐变低阈值 = 中位数 + gradual_sigma * 1.4826 * MAD
+            min_gradual_score: 渐变低阈值的最低值
+            gradual_threshold: 候选渐变起止帧之间的直方图差异阈值（1 - 相关系数）
+            min_gradual_length: 渐变最少持续的帧数量
+            max_gradual_length: 超过该帧数的持续变化视为镜头运动，不算渐变
+            max_gradual_gap: 渐变中允许的低于低阈值的连续帧数量
+            dark_level: 平均亮度低于该值的帧视为黑场（用于区分淡入淡出）
+        """
+        self.window_size = window_size
+        self.min_history = min_history
+        self.histogram_weight = histogram_weight
+        self.cut_sigma = cut_sigma
+        self.min_cut_score = min_cut_score
+        self.cut_ratio = cut_ratio
+        self.cut_isolation = cut_isolation
+        self.gradual_sigma = gradual_sigma
+        self.min_gradual_score = min_gradual_score
+        self.gradual_threshold = gradual_threshold
+        self.min_gradual_length = min_gradual_length
+        self.max_gradual_length = max_gradual_length
+        self.max_gradual_gap = max_gradual_gap
+        self.dark_level = dark_level
+
+        self._window = deque(maxlen=window_size)  # (帧序号, 分数)
+        self._candidate: Optional[Dict[str, Any]] = None
+        self._pending_cut: Optional[Dict[str, Any]] = None
+        self._prev_histogram: Optional[np.ndarray] = None
+        self._prev_intensity = 0.0
+        self._prev_histogram_change = 0.0
+
+    def update(self, frame_idx: int, histogram: np.ndarray, intensity: float,
+               histogram_difference: Optional[float] = None,
+               edge_change_ratio: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        输入下一帧
+
+        Args:
+            frame_idx: 帧序号
+            histogram: 该帧的灰度直方图
+            intensity: 该帧的平均亮度
+            histogram_difference: 与前一帧的直方图差异（1 - 相关系数），第一帧为None
+            edge_change_ratio: 与前一帧的边缘变化率（0-1）
+
+        Returns:
+            本帧确认的转场列表（通常为空或只有一个；硬切打断候选渐变时依次为渐变和硬切），
+            每个转场为字典（frame_idx、start_frame、end_frame、strength、kind: cut/dissolve/fade）
+        """
+        events = []
+        if histogram_difference is not None:
+            score = float(self.score(histogram_difference, edge_change_ratio))
+            median, cut_threshold, low_threshold = self._thresholds()
+            # 候选渐变沿用开始时的低阈值：窗口随渐变本身抬高后，渐变不会被提前截断
+            if self._candidate is not None:
+                low_threshold = self._candidate["low_threshold"]
+
+            histogram_change = min(1.0, float(histogram_difference))
+            if self._pending_cut is not None:
+                pending, self._pending_cut = self._pending_cut, None
+                baseline = pending["baseline"]
+                isolated = (score <= pending["low_threshold"]
+                            or score - baseline < (pending["strength"] - baseline) * self.cut_isolation)
+                if isolated and pending["in_candidate"]:
+                    # 渐变中对比度越过边缘检测阈值时边缘会成片出现或消失，直方图也孤立突变才算硬切；
+                    # 前一帧的直方图变化同样要明显更小，否则是渐变的最后一步（如淡出到静止的黑场）
+                    isolated = (max(histogram_change, pending["prev_histogram_change"])
+                                < pending["histogram_change"] * self.cut_isolation)
+                if isolated:
+                    # 孤立突变：进行中的候选渐变在切点前结束
+                    events.extend(self._confirm_cut(pending))
+                else:
+                    # 突变持续，属于渐变的一部分
+                    self._extend_candidate(pending["frame_idx"], pending["histogram"], pending["intensity"],
+                                           pending["start_histogram"], pending["start_intensity"],
+                                           pending["low_threshold"])
+
+            if score > cut_threshold:
+                self._pending_cut = {"frame_idx": frame_idx, "start_frame": frame_idx, "end_frame": frame_idx,
+                                     "strength": float(score), "kind": "cut",
+                                     "baseline": median, "low_threshold": low_threshold,
+                                     "histogram_change": histogram_change,
+                                     "prev_histogram_change": self._prev_histogram_change,
+                                     "in_candidate": self._candidate is not None,
+                                     "histogram": histogram, "intensity": intensity,
+                                     "start_histogram": self._prev_histogram, "start_intensity": self._prev_intensity}
+            elif score > low_threshold:
+                self._extend_candidate(frame_idx, histogram, intensity, self._prev_histogram, self._prev_intensity,
+                                       low_threshold)
+            elif self._candidate is not None:
+                self._candidate["gap"] += 1
+                if self._candidate["gap"] > self.max_gradual_gap:
+                    events.extend(self._close_candidate())
+            self._window.append((frame_idx, score))
+            self._prev_histogram_change = histogram_change
+
+        self._prev_histogram = histogram
+        self._prev_intensity = intensity
+        return events
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """结束输入，返回尚未确认的硬切和仍在进行中的渐变（若成立）"""
+        if self._pending_cut is not None:
+            pending, self._pending_cut = self._pending_cut, None
+            return self._confirm_cut(pending)
+        return self._close_candidate()
+
+    def score(self, histogram_difference, edge_change_ratio):
+        """帧间变化分数：直方图差异（截断到1）与边缘变化率的加权和，支持NumPy数组"""
+        return (self.histogram_weight * np.minimum(1.0, histogram_difference)
+                + (1.0 - self.histogram_weight) * edge_change_ratio)
+
+    @staticmethod
+    def histogram_distance(histogram1: np.ndarray, histogram2: np.ndarray) -> float:
+        """两个直方图之间的差异（1 - 相关系数，与cv2.HISTCMP_CORREL一致）"""
+        centered1 = histogram1 - histogram1.mean()
+        centered2 = histogram2 - histogram2.mean()
+        denominator = float((centered1 * centered1).sum() * (centered2 * centered2).sum())
+        if denominator <= np.finfo(np.float64).eps:
+            return 0.0
+        return 1.0 - float((centered1 * centered2).sum()) / np.sqrt(denominator)
+
+    def _thresholds(self):
+        """根据窗口的中位数和MAD计算 (中位数, 硬切阈值, 渐变低阈值)"""
+        if len(self._window) < self.min_history:
+            return 0.0, self.min_cut_score, self.min_gradual_score
+        scores = np.fromiter((score for _, score in self._window), dtype=np.float64, count=len(self._window))
+        median = float(np.median(scores))
+        sigma = 1.4826 * float(np.median(np.abs(scores - median)))
+        return (median, max(self.min_cut_score, median + self.cut_sigma * sigma, median * self.cut_ratio),
+                max(self.min_gradual_score, median + self.gradual_sigma * sigma))
+
+    def _confirm_cut(self, pending: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """确认硬切：先结束切点前的候选渐变（若成立），再返回硬切"""
+        events = self._close_candidate()
+        events.append({key: pending[key] for key in ("frame_idx", "start_frame", "end_frame", "strength", "kind")})
+        return events
+
+    def _extend_candidate(self, frame_idx: int, histogram: np.ndarray, intensity: float,
+                          start_histogram: Optional[np.ndarray], start_intensity: float, low_threshold: float):
+        """把一帧并入候选渐变（不存在时以该帧的前一帧为起点新建，并记下当时的低阈值）"""
+        if self._candidate is None:
+            self._candidate = {"start_frame": frame_idx, "start_histogram": start_histogram,
+                               "min_intensity": start_intensity, "low_threshold": low_threshold}
+        self._candidate.update(end_frame=frame_idx, end_histogram=histogram, gap=0,
+                               min_intensity=min(self._candidate["min_intensity"], intensity))
+        if frame_idx - self._candidate["start_frame"] >= self.max_gradual_length:
+            self._candidate = None
+
+    def _close_candidate(self) -> List[Dict[str, Any]]:
+        """结束候选渐变，起止帧差异足够大时返回渐变转场（列表，不成立时为空）"""
+        candidate, self._candidate = self._candidate, None
+        if candidate is None or candidate["start_histogram"] is None:
+            return []
+        if candidate["end_frame"] - candidate["start_frame"] + 1 < self.min_gradual_length:
+            return []
+
+        change = self.histogram_distance(candidate["start_histogram"], candidate["end_histogram"])
+        if change < self.gradual_threshold:
+            return []
+
+        # 渐变不是基线的一部分
+        self._window = deque(((i, score) for i, score in self._window
+                              if not candidate["start_frame"] <= i <= candidate["end_frame"]),
+                             maxlen=self.window_size)
+        dark = candidate["min_intensity"] <= self.dark_level
+        return [{"frame_idx": (candidate["start_frame"] + candidate["end_frame"]) // 2,
+                 "start_frame": candidate["start_frame"], "end_frame": candidate["end_frame"],
+                 "strength": float(min(1.0, change)), "kind": "fade" if dark else "dissolve"}]
@@ -8,23 +8,67 @@ from datetime import datetime
 import json
 import traceback
 
-from app.video_analyzer import VideoAnalyzer
+from app.analysis_executor import (AnalysisCancelledError, AnalysisProcessPool, build_transcription_service,
+                                   build_video_analyzer)
 from app.database_supabase import db_manager
+from app.core.config import get_settings
+from app.task_queue import create_task_queue, new_lease_owner
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class TaskProcessor:
-    """异步任务处理器"""
+    """
+    异步任务处理器
+    
+    任务保存在持久化队列中（默认本地SQLite），以租约方式领取：运行中的任务定期续约，
+    服务重启或部署后，排队中的任务继续执行，被中断的任务重新排队。
+    """
+    
+    # 其他进程提交的任务没有唤醒通知，最长按该间隔检查队列（秒）
+    queue_poll_interval = 5.0
+    # 队列操作失败（如数据库被其他进程锁定）后的重试间隔，连续失败时加倍，最长queue_retry_max_delay秒
+    queue_retry_delay = 1.0
+    queue_retry_max_delay = 30.0
     
     def __init__(self, max_concurrent_tasks: int = 2):
         self.max_concurrent_tasks = max_concurrent_tasks
         self.running_tasks = {}
-        self.task_queue = asyncio.Queue()
+        settings = get_settings()
+        queue_options = {"path": str(settings.task_queue_path)} if settings.task_queue_backend == "sqlite" else {}
+        self.task_queue = create_task_queue(settings.task_queue_backend, **queue_options)
+        self.lease_owner = new_lease_owner()
+        self.lease_seconds = settings.task_lease_seconds
+        self.max_attempts = settings.task_max_attempts
+        # 本进程提交任务时立即唤醒调度器
+        self.queue_wakeup = asyncio.Event()
+        # 空闲槽位：任务结束时立即释放，调度器随即启动下一个任务
+        self.task_slots = asyncio.Semaphore(max_concurrent_tasks)
+        # 运行中任务的取消标志（分析在下一次进度回调时检查并中止）
+        self.cancel_events = {}
+        # 租约已被其他进程接手的任务（本地分析中止，不更新任务状态）
+        self.lost_leases = set()
+        # 分析进程池模式下运行中任务的Future（用于取消）
+        self.analysis_jobs = {}
         self.is_running = False
         self.worker_task = None
-        self.video_analyzer = VideoAnalyzer()
+        self.lease_task = None
+        # process模式：分析在独立的分析进程中运行（处理器启动时预热），不与API请求争用GIL；
+        # thread模式：分析在API进程的线程池中运行
+        self.analysis_pool = None
+        self.video_analyzer = None
+        # Whisper模型在第一次转录时才加载，创建处理器（导入模块）时不加载；
+        # 两种模式下转录都由本进程的转录服务执行（分析进程把转录请求转发过来），只有一组模型
+        if settings.analysis_executor == "process":
+            self.transcription_service = build_transcription_service(settings)
+            self.analysis_pool = AnalysisProcessPool(settings.analysis_workers, self.transcription_service)
+        else:
+            self.video_analyzer = build_video_analyzer(settings)
+            self.transcription_service = self.video_analyzer.whisper
+        # 增量发布的片段：task_id -> {"video_id": ..., "segment_rows": {segment_id: 数据库片段ID}}
+        self.segment_publications = {}
+        self.task_progress = {}
         
     async def start(self):
         """启动任务处理器"""
@@ -32,11 +76,75 @@ class TaskProcessor:
             return
             
         self.is_running = True
+        # 回收上次运行（已退出的进程）持有的租约，被中断的任务重新排队；
+        # 其他主机上退出的进程持有的租约在过期后由lease自动回收
+        try:
+            recovered = await asyncio.to_thread(self.task_queue.recover, self.lease_owner)
+        except Exception as e:
+            logger.error(f"回收被中断的任务失败（租约过期后由lease回收）: {e}")
+            recovered = []
+        for task_id in recovered:
+            await self._update_task_status(task_id, "pending", "0", "服务重启，任务重新排队")
+        if recovered:
+            logger.info(f"已恢复 {len(recovered)} 个被中断的任务: {recovered}")
+        await self._reconcile_orphaned_tasks()
+        
+        if self.analysis_pool:
+            self.analysis_pool.start()
         self.worker_task = asyncio.create_task(self._worker())
-        logger.info("任务处理器已启动")
+        self.lease_task = asyncio.create_task(self._renew_leases())
+        logger.info(f"任务处理器已启动，队列后端: {self.task_queue.name}")
+        
+    async def _reconcile_orphaned_tasks(self):
+        """
+        核对数据库中排队中/运行中的任务与队列（启动时调用）
         
-    async def stop(self):
-        """停止任务处理器"""
+        队列中没有的任务（内存队列重启后丢失、队列文件被删除、提交时入队失败）重新入队，
+        视频文件已不存在的标记为失败。重新入队的任务按数据库中保存的分析开关和可选参数
+        （task_options：采样模式、分段方法、预览格式等）执行，与提交时的配置一致。
+        共用同一数据库的所有进程应共用同一个队列，否则其他进程的任务会被重复执行。
+        """
+        try:
+            # 先取队列快照再查数据库：任务先更新为完成状态再出队，快照之后完成的任务不会被当成孤立任务
+            queued = await asyncio.to_thread(self.task_queue.task_ids)
+            result = db_manager.client.table("analysis_tasks").select("*").in_(
+                "status", ["pending", "running"]).execute()
+        except Exception as e:
+            logger.error(f"核对数据库任务与队列失败: {e}")
+            return
+        
+        orphans = [task for task in result.data or []
+                   if task["id"] not in queued and task["id"] not in self.running_tasks]
+        requeued = []
+        for task in orphans:
+            task_id = task["id"]
+            try:
+                video = await db_manager.get_video_by_id(task["video_id"])
+                video_path = Path("uploads") / video["file_url"].split("/")[-1] if video else None
+                if video_path is None or not video_path.is_file():
+                    message = "服务重启后找不到视频文件，任务无法继续"
+                    await self._update_task_status(task_id, "failed", "0", message, message)
+                    continue
+                task_config = {name: bool(task.get(name)) for name in
+                               ("video_segmentation", "transition_detection", "audio_transcription",
+                                "report_generation")}
+                task_config.update(task.get("task_options") or {})
+                # 其他进程可能刚创建任务、尚未入队，已在队列中时put返回False，任务只执行一次
+                if await asyncio.to_thread(self.task_queue.put, task_id, str(video_path), task_config):
+                    await self._update_task_status(task_id, "pending", "0", "服务重启，任务重新排队")
+                    requeued.append(task_id)
+            except Exception as e:
+                logger.error(f"重新排队孤立任务失败 {task_id}: {e}")
+        if orphans:
+            logger.info(f"数据库中有 {len(orphans)} 个任务不在队列中，已重新排队 {len(requeued)} 个: {requeued}")
+    
+    async def stop(self, drain_timeout: float = 30.0):
+        """
+        停止任务处理器
+        
+        不再启动新任务，等待运行中的任务完成（最多drain_timeout秒），超时后中断剩余任务并放回队列；
+        排队中的任务留在持久化队列中，由下次启动（或其他进程）继续执行。
+        """
         self.is_running = False
         if self.worker_task:
             self.worker_task.cancel()
@@ -44,9 +152,31 @@ class TaskProcessor:
                 await self.worker_task
             except asyncio.CancelledError:
                 pass
+        
+        running = list(self.running_tasks.values())
+        if running:
+            logger.info(f"等待 {len(running)} 个运行中的任务完成（最多 {drain_timeout}s）")
+            _, pending = await asyncio.wait(running, timeout=drain_timeout)
+            if pending:
+                logger.warning(f"{len(pending)} 个任务未在 {drain_timeout}s 内完成，取消")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        if self.lease_task:
+            self.lease_task.cancel()
+            try:
+                await self.lease_task
+            except asyncio.CancelledError:
+                pass
+        
+        if self.analysis_pool:
+            self.analysis_pool.close()
+        if self.transcription_service:
+            self.transcription_service.close()
         logger.info("任务处理器已停止")
         
-    async def submit_task(self, task_id: str, video_path: str, task_config: Dict[str, bool]):
+    async def submit_task(self, task_id: str, video_path: str, task_config: Dict[str, Any]):
         """提交分析任务"""
         task_info = {
             "task_id": task_id,
@@ -55,34 +185,114 @@ class TaskProcessor:
             "submitted_at": datetime.now().isoformat()
         }
         
-        await self.task_queue.put(task_info)
+        if not await asyncio.to_thread(self.task_queue.put, task_id, video_path, task_config):
+            logger.info(f"任务已在队列中: {task_id}")
+            return
+        self.queue_wakeup.set()
         logger.info(f"任务已提交到队列: {task_id}")
+    
+    async def cancel_task(self, task_id: str) -> bool:
+        """
+        取消任务（协作式）
+        
+        排队中的任务直接从队列删除；运行中的任务在分析的下一次进度回调时中止，已发布的片段保留。
+        
+        Returns:
+            任务在排队或运行中时返回True
+        """
+        if task_id in self.running_tasks:
+            self._request_analysis_cancel(task_id)
+            logger.info(f"已请求取消运行中的任务: {task_id}")
+            return True
+        if await asyncio.to_thread(self.task_queue.cancel, task_id):
+            await self._update_task_status(task_id, "failed", "0", "任务已取消", "任务已取消")
+            logger.info(f"已取消排队中的任务: {task_id}")
+            return True
+        return False
         
     async def _worker(self):
-        """工作线程，处理任务队列"""
+        """
+        调度器：等待空闲槽位和队列中的任务，两者都满足时立即启动任务
+        
+        队列操作在线程中执行（SQLite在锁竞争时最多等待30秒，不能阻塞事件循环）；
+        操作失败时释放槽位，按queue_retry_delay退避后重试，调度器不会因此退出。
+        """
+        retry_delay = self.queue_retry_delay
         while self.is_running:
+            await self.task_slots.acquire()
             try:
-                # 检查是否有空闲槽位
-                if len(self.running_tasks) >= self.max_concurrent_tasks:
-                    await asyncio.sleep(1)
-                    continue
-                
-                # 从队列获取任务
+                task_info = await self._next_task()
+            except asyncio.CancelledError:
+                self.task_slots.release()
+                raise
+            except Exception as e:
+                self.task_slots.release()
+                logger.error(f"领取任务失败，{retry_delay:.1f}s后重试: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.queue_retry_max_delay)
+                continue
+            retry_delay = self.queue_retry_delay
+            
+            task_id = task_info["task_id"]
+            if task_info["attempts"] > self.max_attempts:
+                # 反复中断（如分析进程崩溃）的任务不再重试
+                self.task_slots.release()
+                await self._ack_task(task_id)
+                message = f"任务已中断 {task_info['attempts'] - 1} 次，不再重试"
+                await self._update_task_status(task_id, "failed", "0", message, message)
+                continue
+            if task_info["attempts"] > 1:
+                logger.info(f"恢复被中断的任务: {task_id}（第 {task_info['attempts']} 次执行）")
+            
+            # 任务结束（完成、失败或取消）时释放槽位
+            self.cancel_events[task_id] = threading.Event()
+            task = asyncio.create_task(self._process_task(task_info))
+            self.running_tasks[task_id] = task
+            task.add_done_callback(lambda _: self.task_slots.release())
+            
+            logger.info(f"开始处理任务: {task_id}")
+    
+    async def _next_task(self) -> Dict[str, Any]:
+        """
+        领取下一个可执行的任务
+        
+        队列为空时挂起：本进程提交任务时立即唤醒，其他进程提交的任务和过期租约
+        按队列给出的可见时间检查（最长queue_poll_interval秒）。
+        """
+        while True:
+            self.queue_wakeup.clear()
+            task_info = await asyncio.to_thread(self.task_queue.lease, self.lease_owner, self.lease_seconds)
+            if task_info:
+                return task_info
+            visible_in = await asyncio.to_thread(self.task_queue.next_visible_in)
+            timeout = self.queue_poll_interval if visible_in is None else min(visible_in, self.queue_poll_interval)
+            try:
+                await asyncio.wait_for(self.queue_wakeup.wait(), timeout=max(timeout, 0.05))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _renew_leases(self):
+        """租约心跳：每lease_seconds/3为运行中的任务续约；租约已被其他进程接手时中止本地分析"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            for task_id in list(self.running_tasks):
                 try:
-                    task_info = await asyncio.wait_for(self.task_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
+                    renewed = await asyncio.to_thread(self.task_queue.renew, task_id, self.lease_owner,
+                                                      self.lease_seconds)
+                except Exception as e:
+                    logger.warning(f"任务续约失败 {task_id}: {e}")
                     continue
-                
-                # 启动任务处理
-                task_id = task_info["task_id"]
-                task_coroutine = self._process_task(task_info)
-                self.running_tasks[task_id] = asyncio.create_task(task_coroutine)
-                
-                logger.info(f"开始处理任务: {task_id}")
-                
-            except Exception as e:
-                logger.error(f"工作线程异常: {e}")
-                await asyncio.sleep(5)  # 错误后等待5秒
+                if not renewed and task_id not in self.lost_leases:
+                    logger.warning(f"任务租约已失效，中止本地分析: {task_id}")
+                    self.lost_leases.add(task_id)
+                    self._request_analysis_cancel(task_id)
+    
+    def _request_analysis_cancel(self, task_id: str):
+        """设置运行中任务的取消标志（分析进程池模式下同时通知分析进程）"""
+        if task_id in self.cancel_events:
+            self.cancel_events[task_id].set()
+        if task_id in self.analysis_jobs:
+            self.analysis_pool.cancel(self.analysis_jobs[task_id])
     
     async def _process_task(self, task_info: Dict[str, Any]):
         """处理单个分析任务"""
@@ -90,30 +300,56 @@ class TaskProcessor:
         video_path = task_info["video_path"]
         task_config = task_info["task_config"]
         
+        cancelled = self.cancel_events.setdefault(task_id, threading.Event())
+        interrupted = False
         try:
             # 更新任务状态为"运行中"
             await self._update_task_status(task_id, "running", "0", "开始分析")
             
+            # 重新执行（租约过期、重启后恢复、停止时放回队列）的任务从头分析，先删除上次已发布的片段
+            await self._clear_published_segments(task_id)
+            
             # 创建进度回调函数
             async def progress_callback(progress: str, message: str):
                 await self._update_task_status(task_id, "running", progress, message)
             
-            # 在独立线程中运行视频分析（避免阻塞事件循环）
+            # 在独立线程或分析进程中运行视频分析（避免阻塞事件循环）
             loop = asyncio.get_event_loop()
             
-            def sync_analyze():
-                def sync_progress_callback(progress, message):
-                    # 在同步函数中调用异步更新
-                    asyncio.run_coroutine_threadsafe(
-                        progress_callback(progress, message), loop
-                    ).result()
-                
-                return self.video_analyzer.analyze_video(
-                    video_path, task_config, sync_progress_callback, task_id
+            def check_cancelled():
+                if cancelled.is_set():
+                    raise AnalysisCancelledError("任务已取消")
+            
+            def sync_progress_callback(progress, message):
+                check_cancelled()
+                # 在同步函数中调用异步更新
+                asyncio.run_coroutine_threadsafe(
+                    progress_callback(progress, message), loop
+                ).result()
+            
+            def sync_segment_callback(segment):
+                check_cancelled()
+                # 片段一经确认立即保存并发布，不必等整个视频分析完成
+                asyncio.run_coroutine_threadsafe(
+                    self._publish_segment(task_id, segment), loop
+                ).result()
+            
+            if self.analysis_pool:
+                # 在分析进程中执行，回调由进程池的分发线程调用
+                self.analysis_jobs[task_id] = self.analysis_pool.submit(
+                    video_path, task_config, task_id, sync_progress_callback,
+                    segment_callback=sync_segment_callback
                 )
-            
-            # 在线程池中执行同步任务
-            results = await loop.run_in_executor(None, sync_analyze)
+                results = await asyncio.wrap_future(self.analysis_jobs[task_id])
+            else:
+                def sync_analyze():
+                    return self.video_analyzer.analyze_video(
+                        video_path, task_config, sync_progress_callback, task_id,
+                        segment_callback=sync_segment_callback
+                    )
+                
+                # 在线程池中执行同步任务
+                results = await loop.run_in_executor(None, sync_analyze)
             
             # 处理分析结果
             await self._handle_analysis_results(task_id, results, video_path)
@@ -123,6 +359,29 @@ class TaskProcessor:
             
             logger.info(f"任务处理完成: {task_id}")
             
+        except AnalysisCancelledError:
+            if task_id in self.lost_leases:
+                logger.info(f"任务已由其他进程接手，本地分析已中止: {task_id}")
+            else:
+                logger.info(f"任务已取消: {task_id}")
+                await self._update_task_status(task_id, "failed", self.task_progress.get(task_id, "0"),
+                                               "任务已取消", "任务已取消")
+            
+        except asyncio.CancelledError:
+            # stop()等待超时：中止分析并把任务放回队列，下次启动（或其他进程）重新执行
+            interrupted = True
+            requeued = False
+            self._request_analysis_cancel(task_id)
+            try:
+                requeued = await asyncio.to_thread(self.task_queue.release, task_id, self.lease_owner)
+            except Exception as e:
+                # 未能放回：任务留在队列中，租约过期后同样会被重新领取
+                logger.error(f"放回任务队列失败 {task_id}: {e}")
+            logger.warning(f"任务被中断{'，已放回队列' if requeued else ''}: {task_id}")
+            if requeued:
+                await self._update_task_status(task_id, "pending", "0", "服务停止，任务已重新排队")
+            raise
+            
         except Exception as e:
             logger.error(f"任务处理失败 {task_id}: {e}")
             logger.error(traceback.format_exc())
@@ -132,9 +391,24 @@ class TaskProcessor:
             await self._update_task_status(task_id, "failed", "0", error_message, str(e))
         
         finally:
+            # 任务结束，从队列删除（被中断或租约已被其他进程接手时不删除）
+            if not interrupted and task_id not in self.lost_leases:
+                await self._ack_task(task_id)
+            self.lost_leases.discard(task_id)
             # 从运行任务列表中移除
             if task_id in self.running_tasks:
                 del self.running_tasks[task_id]
+            self.segment_publications.pop(task_id, None)
+            self.task_progress.pop(task_id, None)
+            self.analysis_jobs.pop(task_id, None)
+            self.cancel_events.pop(task_id, None)
+    
+    async def _ack_task(self, task_id: str):
+        """从队列删除已结束的任务（失败时只记录日志，未删除的任务在租约过期后会被重新领取）"""
+        try:
+            await asyncio.to_thread(self.task_queue.ack, task_id, self.lease_owner)
+        except Exception as e:
+            logger.error(f"从任务队列删除失败 {task_id}: {e}")
     
     async def _update_task_status(self, task_id: str, status: str, progress: str, 
                                 message: str, error_message: str = None):
@@ -154,6 +428,8 @@ class TaskProcessor:
             if error_message:
                 update_data["error_message"] = error_message
             
+            self.task_progress[task_id] = progress
+            
             # 尝试更新Supabase
             try:
                 result = db_manager.client.table("analysis_tasks").update(update_data).eq("id", task_id).execute()
@@ -278,72 +554,86 @@ class TaskProcessor:
             import traceback
             logger.error(traceback.format_exc())
     
+    async def _publish_segment(self, task_id: str, segment: Dict[str, Any]):
+        """增量保存并发布单个视频片段"""
+        try:
+            publication = await self._get_segment_publication(task_id)
+            if publication["video_id"]:
+                row_id = await self._save_segment_to_database(task_id, publication["video_id"], segment)
+                if row_id:
+                    publication["segment_rows"][segment.get("segment_id", 0)] = row_id
+            
+            progress = self.task_progress.get(task_id, "0")
+            await self._update_task_status(task_id, "running", progress,
+                                           f"已生成片段 {segment.get('segment_id', 0)}")
+        except Exception as e:
+            logger.error(f"发布视频片段失败 {task_id}: {e}")
+    
+    async def _clear_published_segments(self, task_id: str):
+        """删除任务此前执行时已保存的片段及其AI分析数据（片段发布状态只在内存中，无法续接）"""
+        try:
+            result = db_manager.client.table("video_segments").select("id").eq("analysis_task_id", task_id).execute()
+            segment_ids = [row["id"] for row in result.data or []]
+            if not segment_ids:
+                return
+            db_manager.client.table("segment_content_analysis").delete().in_("segment_id", segment_ids).execute()
+            db_manager.client.table("video_segments").delete().eq("analysis_task_id", task_id).execute()
+            logger.info(f"已删除任务上次执行保存的 {len(segment_ids)} 个片段: {task_id}")
+        except Exception as e:
+            logger.error(f"删除任务已保存的片段失败 {task_id}: {e}")
+    
+    async def _get_segment_publication(self, task_id: str) -> Dict[str, Any]:
+        """获取任务的片段发布状态（首次调用时查询video_id）"""
+        if task_id not in self.segment_publications:
+            video_id = None
+            task_info = await db_manager.get_analysis_task_by_id(task_id)
+            if not task_info:
+                logger.warning(f"找不到任务信息: {task_id}")
+            else:
+                video_id = task_info.get("video_id")
+                if not video_id:
+                    logger.warning(f"任务中没有video_id: {task_id}")
+            self.segment_publications[task_id] = {"video_id": video_id, "segment_rows": {}}
+        return self.segment_publications[task_id]
+    
     async def _save_segments_to_database(self, task_id: str, results: Dict[str, Any]):
-        """保存视频片段和AI分析数据到数据库"""
+        """保存视频片段和AI分析数据到数据库（跳过已增量保存的片段，仅补充转录文本）"""
         try:
             segments = results.get("segments", [])
             if not segments:
                 logger.info("没有视频片段数据需要保存")
                 return
             
-            # 获取任务信息来获取video_id
-            task_info = await db_manager.get_analysis_task(task_id)
-            if not task_info:
-                logger.warning(f"找不到任务信息: {task_id}")
-                return
-            
-            video_id = task_info.get("video_id")
+            publication = await self._get_segment_publication(task_id)
+            video_id = publication["video_id"]
             if not video_id:
-                logger.warning(f"任务中没有video_id: {task_id}")
                 return
             
             logger.info(f"开始保存 {len(segments)} 个视频片段到数据库")
             
             for segment in segments:
-                try:
-                    # 保存video_segment记录
-                    segment_data = {
-                        "video_id": video_id,
-                        "analysis_task_id": task_id,
-                        "segment_index": segment.get("segment_id", 0),
-                        "start_time": segment.get("start_time", 0.0),
-                        "end_time": segment.get("end_time", 0.0),
-                        "segment_type": segment.get("scene_type", "未知"),
-                        "description": f"片段 {segment.get('segment_id', 0)}",
-                        "gif_url": segment.get("gif_url"),
-                        "thumbnail_url": segment.get("thumbnail_url")
-                    }
-                    
-                    # 使用Supabase执行SQL插入
-                    insert_result = db_manager.client.table("video_segments").insert(segment_data).execute()
-                    
-                    if insert_result.data:
-                        segment_id = insert_result.data[0]["id"]
-                        logger.info(f"视频片段已保存: segment_id={segment_id}")
-                        
-                        # 保存AI分析数据到segment_content_analysis表
-                        analysis_data = {
-                            "segment_id": segment_id,
-                            "caption": segment.get("transcript_text", ""),
-                            "composition": segment.get("composition_analysis", ""),
-                            "camera_movement": segment.get("camera_movement", ""),
-                            "theme_analysis": segment.get("theme_analysis", ""),
-                            "ai_commentary": segment.get("critical_review", "")
-                        }
-                        
-                        # 只保存非空的分析数据
-                        if any(v for v in analysis_data.values() if v):
-                            analysis_result = db_manager.client.table("segment_content_analysis").insert(analysis_data).execute()
-                            if analysis_result.data:
-                                logger.info(f"AI分析数据已保存: segment_id={segment_id}")
-                            else:
-                                logger.warning(f"AI分析数据保存失败: segment_id={segment_id}")
-                    else:
-                        logger.warning(f"视频片段保存失败: {segment_data}")
-                        
-                except Exception as e:
-                    logger.error(f"保存视频片段失败: {e}")
+                row_id = publication["segment_rows"].get(segment.get("segment_id", 0))
+                if row_id:
+                    # 片段已在分析过程中保存，GIF和转录文本是之后才生成的
+                    if segment.get("gif_url"):
+                        try:
+                            db_manager.client.table("video_segments").update(
+                                {"gif_url": segment["gif_url"], "gif_size": segment.get("gif_size")}
+                            ).eq("id", row_id).execute()
+                        except Exception as e:
+                            logger.error(f"更新片段GIF失败: {e}")
+
+                    caption = segment.get("transcript_text", "")
+                    if caption:
+                        try:
+                            db_manager.client.table("segment_content_analysis").update(
+                                {"caption": caption}
+                            ).eq("segment_id", row_id).execute()
+                        except Exception as e:
+                            logger.error(f"更新片段转录文本失败: {e}")
                     continue
+                
+                await self._save_segment_to_database(task_id, video_id, segment)
             
             logger.info(f"完成保存视频片段到数据库: task_id={task_id}")
             
@@ -352,14 +642,80 @@ class TaskProcessor:
             import traceback
             logger.error(traceback.format_exc())
     
-    def get_queue_status(self) -> Dict[str, Any]:
+    async def _save_segment_to_database(self, task_id: str, video_id: str, segment: Dict[str, Any]):
+        """保存单个视频片段及其AI分析数据，返回数据库中的片段ID"""
+        try:
+            # 保存video_segment记录
+            segment_data = {
+                "video_id": video_id,
+                "analysis_task_id": task_id,
+                "segment_index": segment.get("segment_id", 0),
+                "start_time": segment.get("start_time", 0.0),
+                "end_time": segment.get("end_time", 0.0),
+                "segment_type": segment.get("scene_type", "未知"),
+                "description": f"片段 {segment.get('segment_id', 0)}",
+                "gif_url": segment.get("gif_url"),
+                "gif_size": segment.get("gif_size"),
+                "thumbnail_url": segment.get("thumbnail_url")
+            }
+            
+            # 使用Supabase执行SQL插入
+            insert_result = db_manager.client.table("video_segments").insert(segment_data).execute()
+            
+            if not insert_result.data:
+                logger.warning(f"视频片段保存失败: {segment_data}")
+                return None
+            
+            segment_id = insert_result.data[0]["id"]
+            logger.info(f"视频片段已保存: segment_id={segment_id}")
+            
+            # 保存AI分析数据到segment_content_analysis表
+            analysis_data = {
+                "segment_id": segment_id,
+                "caption": segment.get("transcript_text", ""),
+                "composition": segment.get("composition_analysis", ""),
+                "camera_movement": segment.get("camera_movement", ""),
+                "theme_analysis": segment.get("theme_analysis", ""),
+                "ai_commentary": segment.get("critical_review", "")
+            }
+            
+            # 只保存非空的分析数据
+            if any(v for v in analysis_data.values() if v):
+                analysis_result = db_manager.client.table("segment_content_analysis").insert(analysis_data).execute()
+                if analysis_result.data:
+                    logger.info(f"AI分析数据已保存: segment_id={segment_id}")
+                else:
+                    logger.warning(f"AI分析数据保存失败: segment_id={segment_id}")
+            
+            return segment_id
+            
+        except Exception as e:
+            logger.error(f"保存视频片段失败: {e}")
+            return None
+    
+    async def get_queue_status(self) -> Dict[str, Any]:
         """获取队列状态"""
+        # 队列统计是同步的SQLite查询，放到线程中执行，不阻塞事件循环
+        queue_stats = await asyncio.to_thread(self.task_queue.stats)
+        if self.analysis_pool:
+            # process模式下缓存在各分析进程中，合并各进程发回的统计
+            executor_stats = self.analysis_pool.stats()
+            analysis_cache = executor_stats["analysis_cache"]
+        else:
+            executor_stats = {"mode": "thread"}
+            analysis_cache = (self.video_analyzer.analysis_cache.stats()
+                              if self.video_analyzer.analysis_cache else None)
         return {
             "is_running": self.is_running,
-            "queue_size": self.task_queue.qsize(),
+            "queue_size": queue_stats["queued"],
+            "task_queue": queue_stats,
             "running_tasks": len(self.running_tasks),
             "max_concurrent_tasks": self.max_concurrent_tasks,
-            "running_task_ids": list(self.running_tasks.keys())
+            "running_task_ids": list(self.running_tasks.keys()),
+            "cancel_requested": [task_id for task_id, event in self.cancel_events.items() if event.is_set()],
+            "analysis_executor": executor_stats,
+            "analysis_cache": analysis_cache,
+            "whisper": self.transcription_service.stats() if self.transcription_service else None
         }
 
 # 全局任务处理器实例
@@ -373,10 +729,14 @@ async def stop_task_processor():
     """停止全局任务处理器"""
     await task_processor.stop()
 
-async def submit_analysis_task(task_id: str, video_path: str, task_config: Dict[str, bool]):
+async def cancel_analysis_task(task_id: str) -> bool:
+    """取消排队中或运行中的分析任务"""
+    return await task_processor.cancel_task(task_id)
+
+async def submit_analysis_task(task_id: str, video_path: str, task_config: Dict[str, Any]):
     """提交分析任务到处理器"""
     await task_processor.submit_task(task_id, video_path, task_config)
 
-def get_processor_status() -> Dict[str, Any]:
+async def get_processor_status() -> Dict[str, Any]:
     """获取处理器状态"""
-    return task_processor.get_queue_status() 
\ No newline at end of file
+    return await task_processor.get_queue_status() 
\ No newline at end of file
@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def new_lease_owner() -> str:
+    """当前进程的租约持有者标识：主机名:进程号:随机后缀（进程号被复用时仍可区分）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_is_dead(owner: str, current_owner: str) -> bool:
+    """租约持有者是本机上已经退出的进程（其他主机的持有者无法判断，返回False）"""
+    if owner == current_owner:
+        return False
+    try:
+        host, pid, _ = owner.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        # 进程号被本进程复用：持有者是已退出的旧进程
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class TaskQueue(ABC):
+    """
+    分析任务队列接口
+
+    任务以task_id去重，出队采用租约：lease把最早可执行的任务交给持有者，
+    持有者在lease_seconds内需要renew续约，完成后ack删除，主动放弃时release放回队列；
+    租约过期（持有者崩溃或被强制停止）后任务重新可见，由下一次lease取走，attempts随之增加。
+    """
+
+    name = ""
+
+    @abstractmethod
+    def put(self, task_id: str, video_path: str, task_config: Dict[str, Any]) -> bool:
+        """入队，task_id已在队列中时返回False"""
+
+    @abstractmethod
+    def lease(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        取走最早可执行的任务
+
+        Returns:
+            {"task_id", "video_path", "task_config", "submitted_at", "attempts"}，没有可执行任务时返回None
+        """
+
+    @abstractmethod
+    def renew(self, task_id: str, owner: str, lease_seconds: float) -> bool:
+        """续约，租约已不属于owner时返回False"""
+
+    @abstractmethod
+    def ack(self, task_id: str, owner: str) -> bool:
+        """任务结束（完成、失败或取消），从队列删除"""
+
+    @abstractmethod
+    def release(self, task_id: str, owner: str, delay: float = 0.0) -> bool:
+        """放回队列（服务停止时中断的任务），保持原来的排队顺序（delay为0时），主动放回不计入尝试次数"""
+
+    @abstractmethod
+    def cancel(self, task_id: str) -> bool:
+        """删除排队中（未被租用）的任务"""
+
+    @abstractmethod
+    def recover(self, owner: str) -> List[str]:
+        """立即回收本机已退出进程持有的租约（启动时调用，owner为调用方自己的标识），返回回收的task_id"""
+
+    @abstractmethod
+    def task_ids(self) -> Set[str]:
+        """队列中全部任务（排队中和被租用的）的task_id"""
+
+    @abstractmethod
+    def next_visible_in(self) -> Optional[float]:
+        """距离下一个任务可被lease还有多少秒（0表示现在就有），队列为空时返回None"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """队列后端和排队中、被租用的任务数量"""
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    本地SQLite持久化队列
+
+    同一主机上的多个API进程可以共用一个数据库文件（WAL模式，租约在IMMEDIATE事务中领取），
+    服务重启或部署后，排队中的任务和被中断的任务都保留在文件中。
+    数据库含任务配置和视频路径，应放在不对外提供静态文件服务的目录（默认data/）。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "data/task_queue.sqlite3"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_queue (
+                task_id TEXT PRIMARY KEY,
+                video_path TEXT NOT NULL,
+                task_config TEXT NOT NULL,
+                submitted_at TEXT NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_queue_available "
+                           "ON analysis_queue (available_at)")
+
+    def _transaction(self, fn):
+        """在IMMEDIATE事务中执行（与其他进程的领取互斥）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def put(self, task_id: str, video_path: str, task_config: Dict[str, Any]) -> bool:
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO analysis_queue (task_id, video_path, task_config, submitted_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task_id, str(video_path), json.dumps(task_config, ensure_ascii=False),
+                 time.strftime("%Y-%m-%dT%H:%M:%S"), time.time()))
+            return cursor.rowcount > 0
+        return self._transaction(insert)
+
+    def lease(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        def take(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT * FROM analysis_queue WHERE available_at <= ? "
+                "AND (lease_owner IS NULL OR lease_expires < ?) ORDER BY available_at LIMIT 1",
+                (now, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE analysis_queue SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                         "WHERE task_id = ?", (owner, now + lease_seconds, row["task_id"]))
+            return {"task_id": row["task_id"], "video_path": row["video_path"],
+                    "task_config": json.loads(row["task_config"]), "submitted_at": row["submitted_at"],
+                    "attempts": row["attempts"] + 1}
+        return self._transaction(take)
+
+    def renew(self, task_id: str, owner: str, lease_seconds: float) -> bool:
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE analysis_queue SET lease_expires = ? WHERE task_id = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, task_id, owner)).rowcount > 0)
+
+    def ack(self, task_id: str, owner: str) -> bool:
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM analysis_queue WHERE task_id = ? AND lease_owner = ?", (task_id, owner)).rowcount > 0)
+
+    def release(self, task_id: str, owner: str, delay: float = 0.0) -> bool:
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE analysis_queue SET lease_owner = NULL, lease_expires = NULL, "
+            "available_at = CASE WHEN ? > 0 THEN ? ELSE available_at END, "
+            "attempts = MAX(attempts - 1, 0) WHERE task_id = ? AND lease_owner = ?",
+            (delay, time.time() + delay, task_id, owner)).rowcount > 0)
+
+    def cancel(self, task_id: str) -> bool:
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM analysis_queue WHERE task_id = ? AND (lease_owner IS NULL OR lease_expires < ?)",
+            (task_id, now)).rowcount > 0)
+
+    def recover(self, owner: str) -> List[str]:
+        def reclaim(conn):
+            rows = conn.execute("SELECT task_id, lease_owner FROM analysis_queue "
+                                "WHERE lease_owner IS NOT NULL").fetchall()
+            recovered = [row["task_id"] for row in rows if _owner_is_dead(row["lease_owner"], owner)]
+            conn.executemany("UPDATE analysis_queue SET lease_owner = NULL, lease_expires = NULL "
+                             "WHERE task_id = ?", [(task_id,) for task_id in recovered])
+            return recovered
+        return self._transaction(reclaim)
+
+    def task_ids(self) -> Set[str]:
+        with self._lock:
+            return {row["task_id"] for row in self._conn.execute("SELECT task_id FROM analysis_queue")}
+
+    def next_visible_in(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE WHEN lease_owner IS NULL THEN available_at "
+                "ELSE MAX(available_at, lease_expires) END) FROM analysis_queue").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS total, COUNT(lease_owner) AS leased FROM analysis_queue").fetchone()
+        return {"backend": self.name, "path": str(self.path), "queued": row["total"] - row["leased"],
+                "leased": row["leased"]}
+
+
+class MemoryTaskQueue(TaskQueue):
+    """进程内队列（不持久化，重启后由处理器按数据库中未完成的任务重新入队；只适用于单进程，用于开发和测试）"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, task_id: str, video_path: str, task_config: Dict[str, Any]) -> bool:
+        with self._lock:
+            if task_id in self._tasks:
+                return False
+            self._tasks[task_id] = {"task_id": task_id, "video_path": str(video_path), "task_config": task_config,
+                                    "submitted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                    "available_at": time.time(), "lease_owner": None, "lease_expires": None,
+                                    "attempts": 0}
+            return True
+
+    def lease(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            now = time.time()
+            visible = [task for task in self._tasks.values() if task["available_at"] <= now
+                       and (task["lease_owner"] is None or task["lease_expires"] < now)]
+            if not visible:
+                return None
+            task = min(visible, key=lambda task: task["available_at"])
+            task.update(lease_owner=owner, lease_expires=now + lease_seconds, attempts=task["attempts"] + 1)
+            return {name: task[name] for name in ("task_id", "video_path", "task_config", "submitted_at",
+                                                  "attempts")}
+
+    def _owned(self, task_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        task = self._tasks.get(task_id)
+        return task if task and task["lease_owner"] == owner else None
+
+    def renew(self, task_id: str, owner: str, lease_seconds: float) -> bool:
+        with self._lock:
+            task = self._owned(task_id, owner)
+            if task:
+                task["lease_expires"] = time.time() + lease_seconds
+            return task is not None
+
+    def ack(self, task_id: str, owner: str) -> bool:
+        with self._lock:
+            return bool(self._owned(task_id, owner) and self._tasks.pop(task_id))
+
+    def release(self, task_id: str, owner: str, delay: float = 0.0) -> bool:
+        with self._lock:
+            task = self._owned(task_id, owner)
+            if task:
+                task.update(lease_owner=None, lease_expires=None, attempts=max(task["attempts"] - 1, 0))
+                if delay > 0:
+                    task["available_at"] = time.time() + delay
+            return task is not None
+
+    def cancel(self, task_id: str) -> bool:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or (task["lease_owner"] and task["lease_expires"] >= time.time()):
+                return False
+            del self._tasks[task_id]
+            return True
+
+    def recover(self, owner: str) -> List[str]:
+        return []
+
+    def task_ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._tasks)
+
+    def next_visible_in(self) -> Optional[float]:
+        with self._lock:
+            if not self._tasks:
+                return None
+            visible_at = min(task["available_at"] if task["lease_owner"] is None
+                             else max(task["available_at"], task["lease_expires"])
+                             for task in self._tasks.values())
+        return max(0.0, visible_at - time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            leased = sum(1 for task in self._tasks.values() if task["lease_owner"])
+            return {"backend": self.name, "queued": len(self._tasks) - leased, "leased": leased}
+
+
+TASK_QUEUE_BACKENDS = {backend.name: backend for backend in (SQLiteTaskQueue, MemoryTaskQueue)}
+
+
+def create_task_queue(backend: str = "sqlite", **options) -> TaskQueue:
+    """创建指定后端的任务队列（options原样传给后端构造函数）"""
+    if backend not in TASK_QUEUE_BACKENDS:
+        raise ValueError(f"未知的任务队列后端: {backend}（可选 {', '.join(TASK_QUEUE_BACKENDS)}）")
+    return TASK_QUEUE_BACKENDS[backend](**options)
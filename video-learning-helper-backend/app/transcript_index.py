@@ -0,0 +1,57 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+class TranscriptIndex:
+    """
+    转录片段的有序区间索引
+
+    转录片段按起始时间排序，起始时间与“前缀最大结束时间”各存一个NumPy数组：
+    与区间 [start, end] 重叠的片段满足 起始 <= end 且 结束 >= start，
+    前者在起始时间上二分查找得到上界，后者由前缀最大结束时间（单调不减）二分得到下界，
+    只需检查两个边界之间的片段。S个视频片段的分配总体为 O((S + T) log T)。
+    带词级时间戳（words）的转录片段跨越区间边界时按词拆分，
+    每个词按时间中点只归入一个区间；没有词级时间戳的片段整句归入所有重叠的区间。
+    """
+
+    def __init__(self, transcript_segments: List[Dict[str, Any]]):
+        self.segments = sorted(transcript_segments, key=lambda segment: segment["start"])
+        self.starts = np.array([segment["start"] for segment in self.segments], dtype=np.float64)
+        ends = np.array([segment["end"] for segment in self.segments], dtype=np.float64)
+        self.max_ends = np.maximum.accumulate(ends) if len(ends) else ends
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def overlapping(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """与 [start, end] 重叠（含端点）的转录片段，按起始时间排序"""
+        upper = int(np.searchsorted(self.starts, end, side="right"))
+        lower = int(np.searchsorted(self.max_ends[:upper], start, side="left"))
+        return [segment for segment in self.segments[lower:upper] if segment["end"] >= start]
+
+    def text_between(self, start: float, end: float, separator: str = " ") -> str:
+        """
+        区间内的转录文本
+
+        Args:
+            start: 区间起始时间（秒）
+            end: 区间结束时间（秒）
+            separator: 句子之间的分隔符
+        """
+        texts = []
+        for segment in self.overlapping(start, end):
+            words = segment.get("words")
+            if words and (segment["start"] < start or segment["end"] > end):
+                text = self._words_between(words, start, end)
+            else:
+                text = segment["text"].strip()
+            if text:
+                texts.append(text)
+        return separator.join(texts)
+
+    @staticmethod
+    def _words_between(words: List[Dict[str, Any]], start: float, end: float) -> str:
+        """时间中点落在 [start, end) 内的词；Whisper的词自带前导空格，直接拼接"""
+        return "".join(word["word"] for word in words
+                       if start <= (word["start"] + word["end"]) / 2 < end).strip()
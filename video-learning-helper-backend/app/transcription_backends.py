@@ -0,0 +1,97 @@
+import importlib.util
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class TranscriptionModel(ABC):
+    """
+    转录后端接口
+
+    构造时加载模型，transcribe接收16kHz单声道float32数组，返回与openai-whisper相同结构的结果：
+    {"text", "language", "segments": [{"id", "start", "end", "text", "avg_logprob"}]}，
+    word_timestamps=True时每个片段另有 "words": [{"start", "end", "word", "probability"}]。
+    后端所需的包只在构造时导入。
+    """
+
+    name = ""
+    module = ""
+
+    def __init__(self, model_size: str, compute_type: Optional[str] = None, threads: Optional[int] = None):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.threads = threads
+
+    @classmethod
+    def available(cls) -> bool:
+        """后端依赖是否已安装（只检查，不导入）"""
+        return importlib.util.find_spec(cls.module) is not None
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray, **options) -> Dict[str, Any]:
+        """转录16kHz单声道float32数组"""
+
+
+class OpenAIWhisperModel(TranscriptionModel):
+    """openai-whisper（PyTorch）"""
+
+    name = "whisper"
+    module = "whisper"
+
+    def __init__(self, model_size: str, compute_type: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(model_size, compute_type, threads)
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_size)
+        # CPU不支持fp16，显式使用fp32避免每次转录都告警
+        self.fp16 = compute_type == "float16" and self.model.device.type == "cuda"
+
+    def transcribe(self, audio: np.ndarray, **options) -> Dict[str, Any]:
+        options.setdefault("fp16", self.fp16)
+        return self.model.transcribe(audio, **options)
+
+
+class FasterWhisperModel(TranscriptionModel):
+    """faster-whisper（CTranslate2），CPU上默认使用int8量化"""
+
+    name = "faster-whisper"
+    module = "faster_whisper"
+
+    def __init__(self, model_size: str, compute_type: Optional[str] = None, threads: Optional[int] = None):
+        super().__init__(model_size, compute_type or "int8", threads)
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device="cpu", compute_type=self.compute_type,
+                                  cpu_threads=threads or 0)
+
+    def transcribe(self, audio: np.ndarray, **options) -> Dict[str, Any]:
+        # faster-whisper的片段是惰性生成器，遍历时才真正解码
+        segments, info = self.model.transcribe(audio, **options)
+        result_segments = []
+        for i, segment in enumerate(segments):
+            result_segment = {"id": i, "start": segment.start, "end": segment.end, "text": segment.text,
+                              "avg_logprob": segment.avg_logprob}
+            if segment.words:
+                result_segment["words"] = [{"start": word.start, "end": word.end, "word": word.word,
+                                            "probability": word.probability} for word in segment.words]
+            result_segments.append(result_segment)
+        return {"text": "".join(segment["text"] for segment in result_segments),
+                "language": info.language, "segments": result_segments}
+
+
+TRANSCRIPTION_BACKENDS = {backend.name: backend for backend in (OpenAIWhisperModel, FasterWhisperModel)}
+
+
+def backend_available(backend: str) -> bool:
+    """指定的转录后端是否可用"""
+    return backend in TRANSCRIPTION_BACKENDS and TRANSCRIPTION_BACKENDS[backend].available()
+
+
+def load_transcription_model(backend: str, model_size: str, compute_type: Optional[str] = None,
+                             threads: Optional[int] = None) -> TranscriptionModel:
+    """加载指定后端的转录模型"""
+    if backend not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"未知的转录后端: {backend}（可选 {', '.join(TRANSCRIPTION_BACKENDS)}）")
+    return TRANSCRIPTION_BACKENDS[backend](model_size, compute_type, threads)
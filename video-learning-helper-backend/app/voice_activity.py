@@ -0,0 +1,110 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class EnergyVAD:
+    """
+    基于短时能量的语音活动检测与分块
+
+    按固定长度的帧计算RMS能量（dBFS），以能量分布的低分位数估计底噪、高分位数估计语音电平，
+    高于 min(底噪 + margin_db, 语音电平 - margin_db)（且不低于min_level_db）的帧视为语音，
+    没有停顿的音频（底噪与语音电平接近）整段视为语音：
+    - 短于min_silence的静音并入语音，短于min_speech的语音忽略，语音区间两端各扩展padding
+    - 相邻语音区间间隔不超过max_gap时放入同一块，块长不超过max_chunk；
+      超长的语音区间在后半段能量最低的帧处切开
+    长时间静音不进入任何块，整体为 O(N)。
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_seconds: float = 0.03, margin_db: float = 10.0,
+                 min_level_db: float = -50.0, noise_percentile: float = 10.0, loud_percentile: float = 90.0,
+                 min_silence: float = 0.5,
+                 min_speech: float = 0.2, padding: float = 0.2, max_gap: float = 2.0, max_chunk: float = 30.0):
+        """
+        Args:
+            sample_rate: 音频采样率
+            frame_seconds: 能量帧长度（秒）
+            margin_db: 语音阈值高出底噪的分贝数
+            min_level_db: 语音阈值的最低值（dBFS）
+            noise_percentile: 估计底噪使用的能量分位数
+            loud_percentile: 估计语音电平使用的能量分位数
+            min_silence: 短于该时长的静音并入语音（秒）
+            min_speech: 短于该时长的语音忽略（秒）
+            padding: 语音区间两端扩展的时长（秒）
+            max_gap: 同一块内相邻语音区间的最大间隔（秒）
+            max_chunk: 块的最大时长（秒）
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = max(1, int(sample_rate * frame_seconds))
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.noise_percentile = noise_percentile
+        self.loud_percentile = loud_percentile
+        self.min_silence_frames = int(round(min_silence / frame_seconds))
+        self.min_speech_frames = int(round(min_speech / frame_seconds))
+        self.padding_frames = int(round(padding / frame_seconds))
+        self.max_gap_frames = int(round(max_gap / frame_seconds))
+        self.max_chunk_frames = max(1, int(max_chunk / frame_seconds))
+
+    def frame_levels(self, audio: np.ndarray) -> np.ndarray:
+        """每帧的RMS能量（dBFS），末尾不足一帧的部分单独成帧"""
+        n_frames = -(-len(audio) // self.frame_length)
+        padded = np.zeros(n_frames * self.frame_length, dtype=np.float32)
+        padded[:len(audio)] = audio
+        frames = padded.reshape(n_frames, self.frame_length)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        return 20.0 * np.log10(rms + 1e-10)
+
+    def speech_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """语音区间（帧序号，左闭右开）"""
+        if len(audio) == 0:
+            return []
+        levels = self.frame_levels(audio)
+        noise_level, loud_level = np.percentile(levels, [self.noise_percentile, self.loud_percentile])
+        threshold = max(self.min_level_db, min(noise_level + self.margin_db, loud_level - self.margin_db))
+        is_speech = levels > threshold
+
+        # 语音帧的连续区间
+        edges = np.diff(np.concatenate([[0], is_speech.astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+        regions = []
+        for start, end in zip(starts, ends):
+            if regions and start - regions[-1][1] < self.min_silence_frames:
+                regions[-1][1] = end
+            else:
+                regions.append([start, end])
+
+        n_frames = len(levels)
+        return [(max(0, int(start) - self.padding_frames), min(n_frames, int(end) + self.padding_frames))
+                for start, end in regions if end - start >= self.min_speech_frames]
+
+    def chunks(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        需要转录的音频块
+
+        Returns:
+            [(起始采样, 结束采样)]，按时间顺序，互不重叠
+        """
+        regions = self.speech_regions(audio)
+        if not regions:
+            return []
+        levels = self.frame_levels(audio)
+
+        chunks = []
+        for start, end in regions:
+            if chunks and start - chunks[-1][1] <= self.max_gap_frames and end - chunks[-1][0] <= self.max_chunk_frames:
+                chunks[-1][1] = max(chunks[-1][1], end)
+                continue
+            if chunks:
+                start = max(start, chunks[-1][1])
+            # 超长的语音区间在能量最低处切开
+            while end - start > self.max_chunk_frames:
+                search_start = start + self.max_chunk_frames // 2
+                cut = search_start + int(np.argmin(levels[search_start:start + self.max_chunk_frames]))
+                chunks.append([start, cut])
+                start = cut
+            chunks.append([start, end])
+
+        total = len(audio)
+        return [(start * self.frame_length, min(total, end * self.frame_length)) for start, end in chunks]
@@ -0,0 +1,341 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.transcription_backends import load_transcription_model
+from app.voice_activity import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+# Whisper模型要求的输入采样率
+SAMPLE_RATE = 16000
+
+
+class NoAudioStreamError(RuntimeError):
+    """媒体文件没有音频轨道"""
+
+
+def load_audio(media_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    用FFmpeg把媒体文件的音频直接解码为单声道float32数组
+
+    FFmpeg在解码时完成下混和重采样，PCM通过管道读入内存，不写临时文件。
+
+    Raises:
+        NoAudioStreamError: 没有音频轨道
+        RuntimeError: FFmpeg解码失败
+    """
+    command = ["ffmpeg", "-nostdin", "-threads", "0", "-i", str(media_path),
+               "-vn", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+    process = subprocess.run(command, capture_output=True)
+    stderr = process.stderr.decode("utf-8", errors="ignore")
+    if process.returncode != 0:
+        if "does not contain any stream" in stderr or "matches no streams" in stderr:
+            raise NoAudioStreamError("视频没有音频轨道")
+        raise RuntimeError(f"FFmpeg音频解码失败: {stderr.strip().splitlines()[-1:] }")
+    if not process.stdout:
+        raise NoAudioStreamError("视频没有音频轨道")
+    return np.frombuffer(process.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _worker_main(backend: str, model_size: str, compute_type: Optional[str], requests, responses,
+                 threads: Optional[int] = None):
+    """转录工作进程：第一次收到请求时加载模型，之后该进程处理的所有请求共用这一个模型"""
+    model = None
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, audio, options = request
+        try:
+            if model is None:
+                started = time.time()
+                # 多个转录进程分摊CPU核心，避免线程数超订
+                model = load_transcription_model(backend, model_size, compute_type, threads)
+                responses.put((None, "loaded", time.time() - started))
+            # audio为None的请求只加载模型（预热）；媒体路径在本进程中解码，采样数据不经过队列
+            result = None
+            if audio is not None:
+                result = model.transcribe(load_audio(audio) if isinstance(audio, str) else audio, **options)
+            responses.put((request_id, "ok", result))
+        except NoAudioStreamError as e:
+            responses.put((request_id, "error", e))
+        except Exception as e:
+            responses.put((request_id, "error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+def speech_chunks(audio: Union[str, np.ndarray], vad: EnergyVAD = None) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    解码音频（传入媒体路径时）并用能量VAD在静音处切块
+
+    Returns:
+        (音频数组, [(起始采样, 结束采样)])
+
+    Raises:
+        NoAudioStreamError: 媒体文件没有音频轨道
+    """
+    if not isinstance(audio, np.ndarray):
+        audio = load_audio(str(audio))
+    vad = vad or EnergyVAD(SAMPLE_RATE)
+    chunks = vad.chunks(audio)
+    speech_seconds = sum(end - start for start, end in chunks) / SAMPLE_RATE
+    logger.info(f"语音活动检测: 音频 {len(audio) / SAMPLE_RATE:.1f}s，"
+                f"{len(chunks)} 个语音块共 {speech_seconds:.1f}s")
+    return audio, chunks
+
+
+def merge_chunk_results(chunks: List[Tuple[int, int]], results: List[Dict[str, Any]],
+                        sample_rate: int = SAMPLE_RATE, language: str = None) -> Dict[str, Any]:
+    """
+    把各音频块的转录结果按时间顺序拼接为整段音频的结果
+
+    块内片段（及其词级时间戳）的时间加上块的起始偏移，返回与model.transcribe相同结构的字典。
+    """
+    segments = []
+    texts = []
+    for (start_sample, _), result in zip(chunks, results):
+        offset = start_sample / sample_rate
+        for segment in result.get("segments", []):
+            segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            if segment.get("words"):
+                segment["words"] = [dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                                    for word in segment["words"]]
+            segment["id"] = len(segments)
+            segments.append(segment)
+        text = result.get("text", "").strip()
+        if text:
+            texts.append(text)
+
+    language = language or next((r.get("language") for r in results if r.get("language")), None)
+    # 中文和日文文本之间不加空格
+    separator = "" if language in ("zh", "ja") else " "
+    return {"text": separator.join(texts), "segments": segments, "language": language}
+
+
+class WhisperService:
+    """
+    Whisper模型的惰性加载与共享
+
+    模型由transcription_backends中的后端加载（openai-whisper或faster-whisper），
+    在第一次转录时才加载，构造服务本身不导入后端的包（torch/ctranslate2）。
+    - 进程内模式：模型加载到当前进程，同一服务的所有任务共用一个模型实例
+    - 工作进程模式：模型加载到workers个独立的转录进程（每个进程一个模型），API进程不占用模型内存，
+      各任务的请求通过同一个队列分发给这些进程
+    Whisper解码会在模型上临时挂载KV缓存钩子，同一模型不能并发解码：进程内模式按顺序转录，
+    工作进程模式的并行度等于进程数量。
+    """
+
+    def __init__(self, model_size: str = "base", use_worker_process: bool = False, workers: int = 1,
+                 backend: str = "whisper", compute_type: Optional[str] = None):
+        self.backend = backend
+        self.compute_type = compute_type
+        self.model_size = model_size
+        self.use_worker_process = use_worker_process
+        self.workers = max(1, workers) if use_worker_process else 1
+        self.load_seconds: Optional[float] = None
+        self.loaded_workers = 0
+        self._model = None
+        self._lock = threading.Lock()
+
+        # 工作进程模式
+        self._processes: List[multiprocessing.Process] = []
+        self._requests = None
+        self._responses = None
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count(1)
+        self._dispatcher = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.load_seconds is not None
+
+    def load(self):
+        """立即加载模型（预热），已加载时直接返回；工作进程模式下预热其中一个进程"""
+        if self.use_worker_process:
+            self._submit(None, {}).result()
+            return
+        with self._lock:
+            self._ensure_model()
+
+    def transcribe(self, audio: Union[str, np.ndarray], **options) -> Dict[str, Any]:
+        """
+        整段转录音频
+
+        Args:
+            audio: 媒体文件路径（由load_audio在模型所在进程中解码）或16kHz单声道float32数组
+            options: 原样传给model.transcribe（如language="zh"）
+
+        Raises:
+            NoAudioStreamError: 媒体文件没有音频轨道
+        """
+        if self.use_worker_process:
+            return self._submit(str(audio) if not isinstance(audio, np.ndarray) else audio, options).result()
+
+        if not isinstance(audio, np.ndarray):
+            audio = load_audio(str(audio))
+        with self._lock:
+            return self._ensure_model().transcribe(audio, **options)
+
+    def transcribe_chunked(self, audio: Union[str, np.ndarray], vad: EnergyVAD = None,
+                           **options) -> Dict[str, Any]:
+        """
+        按静音切块转录
+
+        能量VAD把音频在静音处切成不超过vad.max_chunk秒的块，长时间静音不转录；
+        工作进程模式下各块同时分发给所有转录进程，并行度等于进程数量；进程内模式只有一个模型且不能并发解码，
+        各块按顺序转录（切块只省去静音部分）。结果按块的偏移拼接（merge_chunk_results）。
+
+        Raises:
+            NoAudioStreamError: 媒体文件没有音频轨道
+        """
+        audio, chunks = speech_chunks(audio, vad)
+        results = self.transcribe_chunks([audio[start:end] for start, end in chunks], **options)
+        return merge_chunk_results(chunks, results, language=options.get("language"))
+
+    def transcribe_chunks(self, chunks: List[np.ndarray], **options) -> List[Dict[str, Any]]:
+        """
+        分别转录已切好的音频块，按块的顺序返回各块的结果
+
+        工作进程模式下各块同时分发给所有转录进程，进程内模式按顺序转录。
+        """
+        if self.use_worker_process:
+            # np.ascontiguousarray复制切片，只把该块的采样发给工作进程
+            futures = [self._submit(np.ascontiguousarray(chunk), options) for chunk in chunks]
+            return [future.result() for future in futures]
+        with self._lock:
+            model = self._ensure_model()
+            return [model.transcribe(chunk, **options) for chunk in chunks]
+
+    def close(self):
+        """释放模型或停止工作进程"""
+        with self._lock:
+            self._model = None
+            self._stop_workers()
+            for future in self._pending.values():
+                future.set_exception(RuntimeError("转录服务已关闭"))
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "compute_type": self.compute_type,
+            "model_size": self.model_size,
+            "mode": "worker_process" if self.use_worker_process else "in_process",
+            "workers": self.workers,
+            "loaded": self.loaded,
+            "loaded_workers": self.loaded_workers,
+            "load_seconds": self.load_seconds,
+            "worker_pids": [process.pid for process in self._processes],
+            "pending_requests": len(self._pending),
+        }
+
+    def _ensure_model(self):
+        """进程内模式：第一次调用时加载模型（调用方持有锁）"""
+        if self._model is None:
+            started = time.time()
+            self._model = load_transcription_model(self.backend, self.model_size, self.compute_type)
+            self.load_seconds = time.time() - started
+            self.loaded_workers = 1
+            logger.info(f"转录模型 {self.backend}/{self.model_size} 加载完成，耗时 {self.load_seconds:.1f}s")
+        return self._model
+
+    def _submit(self, audio, options: Dict[str, Any]) -> Future:
+        """把请求发给工作进程（首次调用时启动进程）"""
+        future = Future()
+        with self._lock:
+            if not self._processes:
+                self._start_workers()
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            self._requests.put((request_id, audio, options))
+        return future
+
+    def _start_workers(self):
+        # spawn：子进程不继承API进程的事件循环、数据库连接和线程
+        context = multiprocessing.get_context("spawn")
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        threads = max(1, (os.cpu_count() or 1) // self.workers) if self.workers > 1 else None
+        self._processes = [
+            context.Process(target=_worker_main, name=f"{self.backend}-{self.model_size}-{i}",
+                            args=(self.backend, self.model_size, self.compute_type, self._requests,
+                                  self._responses, threads), daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        self.loaded_workers = 0
+        self._dispatcher = threading.Thread(target=self._dispatch, args=(self._processes, self._responses),
+                                            name="whisper-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Whisper转录进程已启动: {[p.pid for p in self._processes]}，模型 {self.backend}/{self.model_size}")
+
+    def _stop_workers(self):
+        """停止工作进程（调用方持有锁）"""
+        if not self._processes:
+            return
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def _dispatch(self, processes, responses):
+        """
+        把工作进程的结果交给等待中的请求
+
+        任一进程意外退出时无法得知它正在处理哪个请求，停止整组进程并让所有请求失败，
+        下一次提交时重新启动。
+        """
+        while True:
+            try:
+                request_id, status, payload = responses.get(timeout=1.0)
+            except Exception:
+                if all(process.is_alive() for process in processes):
+                    continue
+                with self._lock:
+                    if self._processes is processes:
+                        exitcodes = [process.exitcode for process in processes]
+                        self._stop_workers()
+                        pending, self._pending = self._pending, {}
+                        for future in pending.values():
+                            future.set_exception(RuntimeError(f"Whisper转录进程已退出（exitcode={exitcodes}）"))
+                return
+
+            if status == "loaded":
+                self.load_seconds = payload
+                self.loaded_workers += 1
+                logger.info(f"转录模型 {self.backend}/{self.model_size} 在转录进程中加载完成，耗时 {payload:.1f}s")
+                continue
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(payload)
+
+
+_services: Dict[Tuple, WhisperService] = {}
+_services_lock = threading.Lock()
+
+
+def get_whisper_service(model_size: str = "base", use_worker_process: bool = False, workers: int = 1,
+                        backend: str = "whisper", compute_type: Optional[str] = None) -> WhisperService:
+    """按后端、模型和运行模式共享的转录服务（同一进程内的多个分析器共用同一组模型）"""
+    key = (backend, model_size, compute_type, use_worker_process, workers)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = WhisperService(model_size, use_worker_process, workers, backend, compute_type)
+        return _services[key]
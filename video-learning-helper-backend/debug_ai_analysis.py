@@ -94,7 +94,7 @@ async def test_task_processor():
         for i in range(10):  # 最多等待10秒
             await asyncio.sleep(1)
             from app.task_processor import get_processor_status
-            status = get_processor_status()
+            status = await get_processor_status()
             print(f"  📊 处理器状态: 运行任务={status['running_tasks']}, 队列={status['queue_size']}")
             
             if status['running_tasks'] == 0 and status['queue_size'] == 0:
@@ -215,7 +215,7 @@ async def test_complete_flow():
         for i in range(15):  # 最多等待15秒
             await asyncio.sleep(1)
             from app.task_processor import get_processor_status
-            status = get_processor_status()
+            status = await get_processor_status()
             print(f"  📊 第{i+1}秒: 运行任务={status['running_tasks']}, 队列={status['queue_size']}")
             
             if status['running_tasks'] == 0 and status['queue_size'] == 0:
@@ -0,0 +1,207 @@
+"""
+分析缓存的行为测试
+
+条目读写和命中统计、产物以硬链接共享、按最近访问时间淘汰（共享产物只计一次）、
+内存估算大小避免每次写入都扫描缓存目录、记忆表有界、多进程统计合并。
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.analysis_cache import AnalysisCache
+
+
+def _artifact(directory: Path, name: str, size: int = 100_000) -> Path:
+    path = directory / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    path = tmp_path / "out"
+    path.mkdir()
+    return path
+
+
+def _age(cache: AnalysisCache, key: str, seconds_ago: float):
+    """把条目的最近访问时间设到seconds_ago秒前"""
+    accessed = os.stat(cache.cache_dir / key).st_mtime - seconds_ago
+    os.utime(cache.cache_dir / key, (accessed, accessed))
+
+
+def test_key_depends_on_content_config_and_version(tmp_path):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    other_version = AnalysisCache(tmp_path / "cache", "v2")
+    key = cache.key("hash", {"video_segmentation": True})
+    assert key == cache.key("hash", {"video_segmentation": True})
+    assert key != cache.key("other", {"video_segmentation": True})
+    assert key != cache.key("hash", {"video_segmentation": False})
+    assert key != other_version.key("hash", {"video_segmentation": True})
+
+
+def test_content_hash_is_memoized_and_follows_changes(tmp_path):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    cache.hash_memo_size = 2
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"first")
+    first = cache.content_hash(video)
+    assert cache.content_hash(video) == first
+
+    video.write_bytes(b"second content")
+    assert cache.content_hash(video) != first
+
+    for i in range(3):
+        other = tmp_path / f"other{i}.mp4"
+        other.write_bytes(b"first")
+        # 内容相同的文件哈希相同
+        assert cache.content_hash(other) == first
+    assert len(cache._hash_memo) == 2
+
+
+def test_store_and_load_round_trip(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    thumbnail = _artifact(out_dir, "task_segment_1_thumbnail.jpg", 1000)
+    features = np.random.default_rng(0).random((5, 96)).astype(np.float32)
+    cache.store("k" * 64, {"segments": [{"segment_id": 1}]}, [thumbnail, out_dir / "missing.gif"],
+                features=features, timestamps=[0.0, 1.0, 2.0, 3.0, 4.0], meta={"task_id": "task"})
+
+    entry = cache.load("k" * 64)
+    assert entry["results"] == {"segments": [{"segment_id": 1}]}
+    assert entry["meta"] == {"task_id": "task"}
+    assert np.array_equal(entry["features"], features)
+    assert entry["timestamps"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert (entry["artifacts_dir"] / thumbnail.name).read_bytes() == thumbnail.read_bytes()
+    assert not (entry["artifacts_dir"] / "missing.gif").exists()
+
+    assert cache.load("m" * 64) is None
+    assert cache.load("s" * 64, stage="segments") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["stages"] == {"segments": {"hits": 0, "misses": 1}}
+
+
+def test_existing_entry_is_not_overwritten(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    cache.store("k" * 64, {"version": 1}, [])
+    cache.store("k" * 64, {"version": 2}, [])
+    assert cache.load("k" * 64)["results"] == {"version": 1}
+    # 临时目录已清理
+    assert [p.name for p in cache.cache_dir.iterdir()] == ["k" * 64]
+
+
+def test_same_artifact_is_hard_linked_between_entries(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    preview = _artifact(out_dir, "preview.gif")
+    cache.store("a" * 64, {}, [preview], meta={"stage": "segments"})
+    cache.store("b" * 64, {}, [preview])
+    first = cache.cache_dir / ("a" * 64) / "artifacts" / "preview.gif"
+    second = cache.cache_dir / ("b" * 64) / "artifacts" / "preview.gif"
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    # 输出目录中的源文件不被链接（重新生成时会原地覆盖）
+    assert os.stat(preview).st_ino != os.stat(first).st_ino
+
+    # 源文件改变后另存一份
+    preview.write_bytes(os.urandom(1000))
+    cache.store("c" * 64, {}, [preview])
+    third = cache.cache_dir / ("c" * 64) / "artifacts" / "preview.gif"
+    assert os.stat(third).st_ino != os.stat(first).st_ino
+
+
+def test_evicts_least_recently_used_entries(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1", max_bytes=250_000)
+    cache.store("a" * 64, {}, [_artifact(out_dir, "a.jpg")])
+    cache.store("b" * 64, {}, [_artifact(out_dir, "b.jpg")])
+    _age(cache, "a" * 64, 20)
+    _age(cache, "b" * 64, 10)
+    # 命中更新访问时间，a比b更近
+    assert cache.load("a" * 64)
+    cache.store("c" * 64, {}, [_artifact(out_dir, "c.jpg")])
+
+    assert sorted(p.name[0] for p in cache.cache_dir.iterdir()) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_new_entry_is_never_evicted(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1", max_bytes=50_000)
+    cache.store("a" * 64, {}, [_artifact(out_dir, "a.jpg")])
+    assert [p.name for p in cache.cache_dir.iterdir()] == ["a" * 64]
+
+
+def test_shared_artifacts_count_once(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1", max_bytes=150_000)
+    preview = _artifact(out_dir, "preview.gif")
+    for key in "abc":
+        cache.store(key * 64, {}, [preview])
+    assert len(list(cache.cache_dir.iterdir())) == 3
+    assert cache.stats()["evictions"] == 0
+
+
+def test_cache_directory_is_scanned_only_when_the_estimate_exceeds_the_limit(tmp_path, out_dir, monkeypatch):
+    cache = AnalysisCache(tmp_path / "cache", "v1", max_bytes=1_000_000)
+    scans = []
+    iterdir = Path.iterdir
+
+    def counting_iterdir(path):
+        if path == cache.cache_dir:
+            scans.append(path)
+        return iterdir(path)
+
+    monkeypatch.setattr(Path, "iterdir", counting_iterdir)
+    for i in range(30):
+        artifact = _artifact(out_dir, f"{i}.jpg")
+        cache.store(f"{i:064d}", {}, [artifact])
+        # 共享产物的条目不增加估算大小
+        cache.store(f"s{i:063d}", {}, [artifact])
+
+    assert len(scans) < 20
+    # 硬链接的文件只计一次
+    sizes = {}
+    for path in cache.cache_dir.rglob("*"):
+        if path.is_file():
+            stat = os.stat(path)
+            sizes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    total = sum(sizes.values())
+    assert total <= cache.max_bytes
+    assert cache._size_estimate == pytest.approx(total, rel=0.05)
+
+
+def test_rescan_after_interval_sees_other_writers(tmp_path, out_dir, monkeypatch):
+    cache = AnalysisCache(tmp_path / "cache", "v1", max_bytes=250_000)
+    other_process = AnalysisCache(tmp_path / "cache", "v1", max_bytes=250_000)
+    cache.store("a" * 64, {}, [_artifact(out_dir, "a.jpg")])
+    other_process.store("b" * 64, {}, [_artifact(out_dir, "b.jpg")])
+    _age(cache, "a" * 64, 20)
+    _age(cache, "b" * 64, 10)
+
+    # 本进程只知道自己写入的a，估算未超过上限时不扫描
+    cache.store("c" * 64, {}, [_artifact(out_dir, "c.jpg", 10_000)])
+    assert len(list(cache.cache_dir.iterdir())) == 3
+    cache.rescan_interval = 0
+    cache.store("d" * 64, {}, [_artifact(out_dir, "d.jpg")])
+    assert "a" * 64 not in {p.name for p in cache.cache_dir.iterdir()}
+
+
+def test_artifact_memo_is_bounded(tmp_path, out_dir):
+    cache = AnalysisCache(tmp_path / "cache", "v1")
+    cache.artifact_memo_size = 3
+    for i in range(5):
+        cache.store(f"{i:064d}", {}, [_artifact(out_dir, f"{i}.jpg", 100)])
+    assert len(cache._artifact_memo) == 3
+
+
+def test_combine_stats():
+    assert AnalysisCache.combine_stats([]) is None
+    assert AnalysisCache.combine_stats([None, None]) is None
+    first = {"hits": 1, "misses": 3, "evictions": 1, "stages": {"features": {"hits": 1, "misses": 1}},
+             "cache_dir": "cache", "max_bytes": 10}
+    second = {"hits": 3, "misses": 1, "evictions": 0,
+              "stages": {"features": {"hits": 2, "misses": 0}, "segments": {"hits": 0, "misses": 1}},
+              "cache_dir": "cache", "max_bytes": 10}
+    combined = AnalysisCache.combine_stats([first, None, second])
+    assert combined == {"hits": 4, "misses": 4, "evictions": 1, "hit_rate": 0.5,
+                        "stages": {"features": {"hits": 3, "misses": 1}, "segments": {"hits": 0, "misses": 1}},
+                        "cache_dir": "cache", "max_bytes": 10, "processes": 2}
@@ -0,0 +1,162 @@
+"""
+采样帧缓冲区的行为测试
+
+SampleFrameBuffer：抽稀后占用有界、最近帧和固定帧精确可取、区间限定的近邻查询、固定帧JPEG保存；
+SeekingSampleFrames：按采样序号精确定位读取。
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.frame_buffer import SampleFrameBuffer, SeekingSampleFrames
+
+
+def _frame(index: int) -> np.ndarray:
+    """帧内容就是它的采样序号，取回后可以直接核对"""
+    return np.full((2, 2, 3), index, np.int32)
+
+
+def _index_of(frame) -> int:
+    return int(frame[0, 0, 0])
+
+
+def _unpinned(buffer: SampleFrameBuffer) -> int:
+    return len(buffer) - sum(1 for index in buffer._pinned if index in buffer)
+
+
+@pytest.mark.parametrize("capacity", [2, 16, 120])
+def test_thinning_keeps_memory_bounded(capacity):
+    buffer = SampleFrameBuffer(capacity, keep_recent=4)
+    # 最近帧不参与抽稀，容量小于最近窗口时占用为最近帧加序号0
+    bound = max(capacity, 4 + 1)
+    for index in range(5000):
+        buffer.add(index, _frame(index))
+        assert len(buffer) <= bound
+    # 抽稀后保留的是步长的整数倍，序号0始终保留
+    assert buffer.stride > 1
+    assert 0 in buffer
+    assert all(index % buffer.stride == 0 or index > 4999 - 4 for index in buffer._frames)
+
+
+def test_recent_frames_are_exact():
+    buffer = SampleFrameBuffer(8, keep_recent=5)
+    for index in range(1000):
+        buffer.add(index, _frame(index))
+        for recent in range(max(0, index - 4), index + 1):
+            assert _index_of(buffer.get(recent)) == recent
+
+
+def test_pinned_frames_survive_thinning_and_do_not_count_toward_capacity():
+    buffer = SampleFrameBuffer(16, keep_recent=4)
+    pinned = [7, 37, 501, 999, 1234]
+    for index in pinned[:2]:
+        # 可以固定尚未加入的帧
+        buffer.pin(index)
+    for index in range(2000):
+        buffer.add(index, _frame(index))
+        if index in pinned[2:]:
+            buffer.pin(index)
+        assert _unpinned(buffer) <= 16
+    for index in pinned:
+        assert index in buffer
+        assert _index_of(buffer.get(index)) == index
+
+
+def test_get_only_falls_back_within_range():
+    buffer = SampleFrameBuffer(4, keep_recent=2)
+    for index in range(100):
+        buffer.add(index, _frame(index))
+    kept = sorted(buffer._frames)
+    missing = next(index for index in range(1, 100) if index not in buffer)
+    before = max(i for i in kept if i < missing)
+    after = min(i for i in kept if i > missing)
+
+    # 不给区间时只接受精确序号
+    assert buffer.get(missing) is None
+    # 区间内有保留帧时返回最近的一个
+    nearest = min((before, after), key=lambda i: abs(i - missing))
+    assert _index_of(buffer.get(missing, before, after)) == nearest
+    assert _index_of(buffer.get(missing, missing, after)) == after
+    assert _index_of(buffer.get(missing, before, missing)) == before
+    # 区间内没有保留帧（最近的帧属于相邻片段）时返回None
+    assert buffer.get(missing, missing, missing) is None
+    assert buffer.get(missing, before + 1, after - 1) is None
+
+
+def test_release_before_drops_frames_and_pins():
+    buffer = SampleFrameBuffer(100, keep_recent=4)
+    for index in range(50):
+        buffer.add(index, _frame(index))
+    buffer.pin(10)
+    buffer.pin(30)
+    buffer.release_before(20)
+    assert min(buffer._frames) == 20
+    assert buffer._pinned == {30}
+
+
+def test_encode_pinned_stores_old_pinned_frames_as_jpeg():
+    image = cv2.GaussianBlur(np.random.default_rng(0).integers(0, 256, (90, 160, 3)).astype(np.uint8), (0, 0), 3)
+    buffer = SampleFrameBuffer(8, keep_recent=3, encode_pinned=True)
+    buffer.pin(2)
+    for index in range(40):
+        buffer.add(index, image if index in (2, 20) else np.zeros_like(image))
+        if index == 20:
+            # 固定时仍在最近窗口内：移出窗口后才编码
+            buffer.pin(20)
+            assert isinstance(buffer._frames[20], np.ndarray)
+
+    for index in (2, 20):
+        assert isinstance(buffer._frames[index], bytes)
+        decoded = buffer.get(index)
+        assert decoded.shape == image.shape
+        assert np.abs(decoded.astype(int) - image).mean() < 3
+    # 没有固定的帧保持原样
+    assert isinstance(buffer._frames[39], np.ndarray)
+
+
+def test_pinned_frames_are_not_encoded_by_default():
+    buffer = SampleFrameBuffer(8, keep_recent=3)
+    buffer.pin(2)
+    for index in range(40):
+        buffer.add(index, _frame(index))
+    assert isinstance(buffer._frames[2], np.ndarray)
+
+
+def _write_numbered_video(path, count: int):
+    """每帧用整帧灰度值标出帧号（MJPG压缩后仍可分辨）"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for index in range(count):
+        writer.write(np.full((48, 64, 3), index * 4, np.uint8))
+    writer.release()
+
+
+def _frame_number(frame) -> int:
+    return int(round(frame.mean() / 4))
+
+
+def test_seeking_frames_reads_sample_index_times_interval(tmp_path):
+    video = tmp_path / "numbered.avi"
+    _write_numbered_video(video, 60)
+    frames = SeekingSampleFrames(video, sample_interval=5, memo_size=2)
+    try:
+        for index in (3, 0, 11, 3):
+            assert _frame_number(frames.get(index)) == index * 5
+        assert len(frames._frames) <= 2
+        # 超出视频长度时返回None
+        assert frames.get(100) is None
+    finally:
+        frames.close()
+    assert frames._cap is None
+
+
+def test_seeking_frames_applies_transform(tmp_path):
+    video = tmp_path / "numbered.avi"
+    _write_numbered_video(video, 20)
+    frames = SeekingSampleFrames(video, sample_interval=2, transform=lambda frame: cv2.resize(frame, (16, 12)))
+    try:
+        frame = frames.get(4)
+        assert frame.shape == (12, 16, 3)
+        assert _frame_number(frame) == 8
+    finally:
+        frames.close()
@@ -0,0 +1,87 @@
+"""
+流式变化点分割器的行为测试
+
+特征为H/S/V三个通道拼接的归一化直方图，用集中在不同直方柱的合成特征代表不同场景。
+"""
+
+import numpy as np
+import pytest
+
+from app.scene_segmenter import ChangePointSegmenter
+
+BINS = 8
+
+
+def _feature(scene: int, mix: float = 0.0, other: int = None) -> np.ndarray:
+    """场景scene的直方图特征；给出other时按mix比例混入另一个场景"""
+    channel = np.zeros(BINS)
+    channel[scene % BINS] += 1 - mix
+    if other is not None:
+        channel[other % BINS] += mix
+    return np.concatenate([channel] * 3)
+
+
+def _run(segmenter: ChangePointSegmenter, features):
+    """逐个输入特征，返回update确认边界时的 (输入序号, 边界)"""
+    confirmed = []
+    for index, feature in enumerate(features):
+        boundary = segmenter.update(feature)
+        if boundary is not None:
+            confirmed.append((index, boundary))
+    return confirmed
+
+
+def test_distance_range():
+    assert ChangePointSegmenter.distance(_feature(0), _feature(0)) == 0
+    assert ChangePointSegmenter.distance(_feature(0), _feature(1)) == pytest.approx(1.0)
+    assert ChangePointSegmenter.distance(_feature(0), _feature(0, 0.5, 1)) == pytest.approx(0.5)
+
+
+def test_constant_scene_has_no_boundaries():
+    segmenter = ChangePointSegmenter()
+    assert _run(segmenter, [_feature(0)] * 50) == []
+    assert segmenter.finish() == [0]
+    assert segmenter.sample_count == 50
+
+
+@pytest.mark.parametrize("confirm_length", [1, 2, 4])
+def test_boundaries_confirmed_after_confirm_length_samples(confirm_length):
+    segmenter = ChangePointSegmenter(confirm_length=confirm_length)
+    features = [_feature(0)] * 20 + [_feature(1)] * 20 + [_feature(0)] * 20
+    # 边界是偏离开始的采样，在第confirm_length个偏离采样输入时确认
+    assert _run(segmenter, features) == [(20 + confirm_length - 1, 20), (40 + confirm_length - 1, 40)]
+    assert segmenter.finish() == [0, 20, 40]
+
+
+def test_single_sample_flash_is_not_a_boundary():
+    segmenter = ChangePointSegmenter(confirm_length=2)
+    features = [_feature(0)] * 20 + [_feature(3)] + [_feature(0)] * 20
+    assert _run(segmenter, features) == []
+    assert segmenter.finish() == [0]
+
+
+def test_unconfirmed_candidates_at_end_are_dropped():
+    segmenter = ChangePointSegmenter(confirm_length=3)
+    _run(segmenter, [_feature(0)] * 20 + [_feature(1)] * 2)
+    assert segmenter.finish() == [0]
+
+
+def test_gradual_drift_below_threshold_follows_the_scene():
+    """缓慢变化的画面（参考窗口随之更新）不产生边界"""
+    segmenter = ChangePointSegmenter(threshold=0.2, window_size=5)
+    features = [_feature(0, mix=t / 100, other=1) for t in range(101)]
+    assert _run(segmenter, features) == []
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_segments_respect_min_segment_length(seed):
+    rng = np.random.default_rng(seed)
+    features = []
+    for scene in range(30):
+        features += [_feature(scene)] * int(rng.integers(1, 8))
+    segmenter = ChangePointSegmenter(min_segment_length=4, confirm_length=1)
+    _run(segmenter, features)
+    boundaries = segmenter.finish()
+    assert len(boundaries) > 1
+    assert all(b - a >= 4 for a, b in zip(boundaries, boundaries[1:]))
+    assert boundaries == sorted(set(boundaries))
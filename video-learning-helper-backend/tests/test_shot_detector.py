@@ -0,0 +1,133 @@
+"""
+镜头边界检测的行为测试
+
+合成视频写成MJPG文件后走完整的解码扫描流程（带压缩噪声）：
+平移镜头中的硬切、纯色卡片上的硬切/叠化/淡入淡出。
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.video_analyzer import VideoAnalyzer
+
+FPS = 25
+SIZE = (320, 180)
+
+
+def _scene(seed: int) -> np.ndarray:
+    """一张可平移的纹理大图：模糊噪声底图加大量小色块，每个场景的影调不同"""
+    rng = np.random.default_rng(seed)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (720, 1280, 3)).astype(np.uint8), (0, 0), 6)
+    image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX)
+    for _ in range(600):
+        x, y = (int(v) for v in rng.integers(0, 1200, 2))
+        w, h = (int(v) for v in rng.integers(8, 60, 2))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, -1)
+    gamma = float(rng.uniform(0.5, 2.0))
+    return (255 * (image / 255.0) ** gamma).astype(np.uint8)
+
+
+def _panning_frames(cuts, total: int, speed: int, seed: int):
+    """匀速来回平移的镜头，在cuts给出的帧切换到下一个场景"""
+    rng = np.random.default_rng(seed)
+    bounds = [0, *cuts, total]
+    frames = []
+    for shot in range(len(bounds) - 1):
+        image = _scene(seed * 10 + shot)
+        span = image.shape[1] - SIZE[0]
+        for k in range(bounds[shot + 1] - bounds[shot]):
+            x = abs((k * speed) % (2 * span) - span)
+            frame = image[100:100 + SIZE[1], x:x + SIZE[0]].astype(np.int16)
+            frame += rng.normal(0, 4, frame.shape).astype(np.int16)
+            frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def _card(color, count: int):
+    frame = np.full((SIZE[1], SIZE[0], 3), color, np.uint8)
+    cv2.putText(frame, "TITLE", (60, 100), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return [frame] * count
+
+
+def _blend(frame1, frame2, count: int):
+    return [cv2.addWeighted(frame1, 1 - t / (count + 1), frame2, t / (count + 1), 0) for t in range(1, count + 1)]
+
+
+def _write_video(path, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, SIZE)
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return VideoAnalyzer(output_dir=str(tmp_path / "output"), persist_frame_features=False)
+
+
+@pytest.mark.parametrize("speed,seed", [(2, 0), (5, 1), (9, 2)])
+def test_cuts_in_panning_footage(analyzer, tmp_path, speed, seed):
+    """持续平移的镜头抬高了分数基线，硬切仍在准确的帧上被识别，平移本身不产生转场"""
+    cuts = (100, 200, 300)
+    video = _write_video(tmp_path / "pan.avi", _panning_frames(cuts, 400, speed, seed))
+
+    transitions = analyzer._detect_transitions(video)
+
+    assert [t["type"] for t in transitions] == ["硬切"] * len(cuts)
+    assert [round(t["timestamp"] * FPS) for t in transitions] == list(cuts)
+
+
+def test_panning_without_cuts(analyzer, tmp_path):
+    video = _write_video(tmp_path / "pan.avi", _panning_frames((), 300, 5, 3))
+
+    assert analyzer._detect_transitions(video) == []
+
+
+def _cards_with_gradual_transitions():
+    red, green, blue, yellow = (_card(color, 1)[0] for color in
+                                ((200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40)))
+    black = np.zeros_like(red)
+    return (_card((200, 40, 40), 60) + _card((40, 200, 40), 60)              # 硬切 @60
+            + _blend(green, blue, 24) + _card((40, 40, 200), 60)            # 叠化 120-143
+            + _blend(blue, black, 15) + [black] * 30                        # 淡出 204-218
+            + _blend(black, yellow, 15) + _card((200, 200, 40), 60))        # 淡入 249-263
+
+
+def test_cut_dissolve_and_fades_on_cards(analyzer, tmp_path):
+    video = _write_video(tmp_path / "cards.avi", _cards_with_gradual_transitions())
+
+    transitions = analyzer._detect_transitions(video)
+
+    assert [t["type"] for t in transitions] == ["硬切", "渐变", "淡入淡出", "淡入淡出"]
+    assert round(transitions[0]["timestamp"] * FPS) == 60
+    assert 120 <= round(transitions[1]["timestamp"] * FPS) <= 144
+
+
+def _cut_frames(analyzer, video, stride: int):
+    return [(t["type"], round(t["timestamp"] * FPS)) for t in analyzer._detect_transitions(video, transition_stride=stride)
+            if t["type"] == "硬切"]
+
+
+@pytest.mark.parametrize("stride", [2, 5, 8])
+def test_coarse_scan_finds_same_cuts_on_cards(analyzer, tmp_path, stride):
+    """粗扫描在纯色卡片上找到与逐帧扫描相同的硬切（精确到帧），渐变类型不变"""
+    colors = ((200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40), (40, 200, 200), (200, 40, 200))
+    video = _write_video(tmp_path / "scenes.avi", [frame for color in colors for frame in _card(color, 53)])
+    assert _cut_frames(analyzer, video, 1) == [("硬切", 53 * i) for i in range(1, len(colors))]
+    assert _cut_frames(analyzer, video, stride) == _cut_frames(analyzer, video, 1)
+
+    video = _write_video(tmp_path / "cards.avi", _cards_with_gradual_transitions())
+    assert ([t["type"] for t in analyzer._detect_transitions(video, transition_stride=stride)]
+            == [t["type"] for t in analyzer._detect_transitions(video)])
+
+
+@pytest.mark.parametrize("stride,speed,seed", [(3, 9, 2), (5, 5, 1), (8, 5, 1)])
+def test_coarse_scan_finds_same_cuts_in_panning_footage(analyzer, tmp_path, stride, speed, seed):
+    """相隔多帧时平移使ECR饱和，粗扫描只比较直方图，仍与逐帧扫描找到相同的硬切"""
+    video = _write_video(tmp_path / "pan.avi", _panning_frames((100, 200, 300), 400, speed, seed))
+
+    assert _cut_frames(analyzer, video, stride) == _cut_frames(analyzer, video, 1) == [
+        ("硬切", 100), ("硬切", 200), ("硬切", 300)]
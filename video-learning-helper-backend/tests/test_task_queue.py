@@ -0,0 +1,187 @@
+"""
+任务队列的行为测试
+
+SQLite和内存两个后端跑同一组用例：去重、先进先出、租约过期后重新可见、续约/确认/放回/取消的归属检查；
+SQLite另测持久化和回收已退出进程的租约。时间由可控的时钟给出。
+"""
+
+import socket
+import subprocess
+import sys
+import time
+import types
+
+import pytest
+
+from app import task_queue
+from app.task_queue import MemoryTaskQueue, SQLiteTaskQueue, TaskQueue, create_task_queue
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def strftime(self, fmt: str) -> str:
+        return time.strftime(fmt, time.localtime(self.now))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(task_queue, "time", types.SimpleNamespace(time=clock.time, strftime=clock.strftime))
+    return clock
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def queue(request, tmp_path, clock):
+    if request.param == "sqlite":
+        return SQLiteTaskQueue(str(tmp_path / "queue.sqlite3"))
+    return MemoryTaskQueue()
+
+
+def _put(queue, clock, *task_ids):
+    for task_id in task_ids:
+        assert queue.put(task_id, f"uploads/{task_id}.mp4", {"video_segmentation": True, "id": task_id})
+        clock.now += 1
+
+
+def test_put_deduplicates_and_lease_is_fifo(queue, clock):
+    _put(queue, clock, "a", "b", "c")
+    assert not queue.put("a", "other.mp4", {})
+    assert queue.task_ids() == {"a", "b", "c"}
+
+    task = queue.lease("w1", 60)
+    assert task == {"task_id": "a", "video_path": "uploads/a.mp4",
+                    "task_config": {"video_segmentation": True, "id": "a"},
+                    "submitted_at": task["submitted_at"], "attempts": 1}
+    assert [queue.lease("w2", 60)["task_id"], queue.lease("w2", 60)["task_id"]] == ["b", "c"]
+    assert queue.lease("w3", 60) is None
+    assert queue.stats()["queued"] == 0
+    assert queue.stats()["leased"] == 3
+
+
+def test_expired_lease_becomes_visible_again(queue, clock):
+    _put(queue, clock, "a")
+    assert queue.lease("w1", 30)["attempts"] == 1
+    clock.now += 29
+    assert queue.lease("w2", 30) is None
+
+    clock.now += 2
+    task = queue.lease("w2", 30)
+    assert task["task_id"] == "a"
+    assert task["attempts"] == 2
+    # 原持有者已失去租约
+    assert not queue.renew("a", "w1", 30)
+    assert not queue.ack("a", "w1")
+    assert not queue.release("a", "w1")
+    assert queue.ack("a", "w2")
+    assert queue.task_ids() == set()
+
+
+def test_renew_extends_the_lease(queue, clock):
+    _put(queue, clock, "a")
+    queue.lease("w1", 30)
+    clock.now += 25
+    assert queue.renew("a", "w1", 30)
+    clock.now += 25
+    assert queue.lease("w2", 30) is None
+    assert queue.next_visible_in() == pytest.approx(5)
+
+
+def test_release_keeps_order_and_does_not_count_an_attempt(queue, clock):
+    _put(queue, clock, "a", "b")
+    queue.lease("w1", 60)
+    assert queue.release("a", "w1")
+    task = queue.lease("w1", 60)
+    assert task["task_id"] == "a"
+    assert task["attempts"] == 1
+
+
+def test_release_with_delay_hides_the_task(queue, clock):
+    _put(queue, clock, "a", "b")
+    queue.lease("w1", 60)
+    assert queue.release("a", "w1", delay=10)
+    assert queue.lease("w1", 60)["task_id"] == "b"
+    assert queue.lease("w1", 60) is None
+    assert queue.next_visible_in() == pytest.approx(10)
+    clock.now += 10
+    assert queue.lease("w1", 60)["task_id"] == "a"
+
+
+def test_cancel_only_removes_unleased_tasks(queue, clock):
+    _put(queue, clock, "a", "b")
+    queue.lease("w1", 30)
+    assert not queue.cancel("a")
+    assert queue.cancel("b")
+    assert not queue.cancel("b")
+    # 租约过期后可以取消
+    clock.now += 31
+    assert queue.cancel("a")
+    assert queue.task_ids() == set()
+
+
+def test_next_visible_in(queue, clock):
+    assert queue.next_visible_in() is None
+    _put(queue, clock, "a")
+    assert queue.next_visible_in() == 0
+    queue.lease("w1", 30)
+    assert queue.next_visible_in() == pytest.approx(30)
+
+
+def test_sqlite_queue_persists_across_instances(tmp_path, clock):
+    path = str(tmp_path / "queue.sqlite3")
+    first = SQLiteTaskQueue(path)
+    _put(first, clock, "a", "b")
+    first.lease("w1", 60)
+
+    second = SQLiteTaskQueue(path)
+    assert second.task_ids() == {"a", "b"}
+    assert second.stats()["leased"] == 1
+    assert second.lease("w2", 60)["task_id"] == "b"
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_sqlite_recover_reclaims_leases_of_exited_processes(tmp_path, clock):
+    queue = SQLiteTaskQueue(str(tmp_path / "queue.sqlite3"))
+    me = task_queue.new_lease_owner()
+    owners = {"dead": f"{socket.gethostname()}:{_dead_pid()}:deadbeef",
+              "remote": "another-host:1:cafebabe",
+              "mine": me}
+    _put(queue, clock, *owners)
+    for task_id, owner in owners.items():
+        assert queue.lease(owner, 3600)["task_id"] == task_id
+
+    assert queue.recover(me) == ["dead"]
+    # 回收的任务立即可见，不必等租约过期
+    assert queue.lease(me, 60)["task_id"] == "dead"
+
+
+def test_memory_recover_is_a_no_op(clock):
+    queue = MemoryTaskQueue()
+    _put(queue, clock, "a")
+    queue.lease("gone:1:x", 60)
+    assert queue.recover("me") == []
+
+
+def test_create_task_queue(tmp_path):
+    assert isinstance(create_task_queue("memory"), MemoryTaskQueue)
+    assert isinstance(create_task_queue("sqlite", path=str(tmp_path / "q.sqlite3")), SQLiteTaskQueue)
+    with pytest.raises(ValueError):
+        create_task_queue("redis")
+
+
+def test_incomplete_backend_fails_at_construction():
+    class IncompleteQueue(TaskQueue):
+        def put(self, task_id, video_path, task_config):
+            return True
+
+    with pytest.raises(TypeError):
+        IncompleteQueue()
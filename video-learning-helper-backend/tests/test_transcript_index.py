@@ -0,0 +1,73 @@
+"""
+转录区间索引的行为测试
+
+重叠查询与逐个比较的结果一致（包括跨越多个短片段的长片段），跨区间的片段按词拆分。
+"""
+
+import numpy as np
+import pytest
+
+from app.transcript_index import TranscriptIndex
+
+
+def _segment(start: float, end: float, text: str = "", words=None):
+    segment = {"start": start, "end": end, "text": text or f"{start}-{end}"}
+    if words is not None:
+        segment["words"] = words
+    return segment
+
+
+def _brute_force(segments, start: float, end: float):
+    return sorted((s for s in segments if s["start"] <= end and s["end"] >= start), key=lambda s: s["start"])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_overlapping_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    segments = []
+    for _ in range(200):
+        start = float(rng.uniform(0, 600))
+        # 少数长片段跨越很多短片段，前缀最大结束时间不等于各自的结束时间
+        length = float(rng.uniform(50, 200) if rng.random() < 0.05 else rng.uniform(0, 8))
+        segments.append(_segment(round(start, 2), round(start + length, 2)))
+    index = TranscriptIndex(segments)
+    for _ in range(200):
+        start = float(rng.uniform(-10, 620))
+        end = start + float(rng.uniform(0, 30))
+        assert index.overlapping(start, end) == _brute_force(segments, start, end)
+
+
+def test_overlapping_includes_touching_endpoints():
+    index = TranscriptIndex([_segment(0, 5), _segment(5, 10), _segment(10, 15)])
+    assert [s["start"] for s in index.overlapping(5, 10)] == [0, 5, 10]
+    assert [s["start"] for s in index.overlapping(5.5, 9.5)] == [5]
+
+
+def test_empty_index():
+    index = TranscriptIndex([])
+    assert len(index) == 0
+    assert index.overlapping(0, 100) == []
+    assert index.text_between(0, 100) == ""
+
+
+def test_text_between_splits_words_by_midpoint():
+    words = [{"start": 0.0, "end": 1.0, "word": " one"}, {"start": 1.0, "end": 2.2, "word": " two"},
+             {"start": 2.2, "end": 3.0, "word": " three"}, {"start": 3.0, "end": 4.0, "word": " four"}]
+    index = TranscriptIndex([_segment(0, 4, "one two three four", words)])
+    # two的中点1.6落在第一个区间，每个词只归入一个区间
+    assert index.text_between(0, 2) == "one two"
+    assert index.text_between(2, 4) == "three four"
+    # 片段完全落在区间内时直接使用整句
+    assert index.text_between(0, 10) == "one two three four"
+
+
+def test_text_between_without_words_uses_whole_sentence_in_every_overlap():
+    index = TranscriptIndex([_segment(0, 4, " 第一句 "), _segment(4, 8, "第二句")])
+    assert index.text_between(0, 2) == "第一句"
+    assert index.text_between(3, 6, separator="") == "第一句第二句"
+    assert index.text_between(9, 12) == ""
+
+
+def test_segments_are_sorted_by_start():
+    index = TranscriptIndex([_segment(10, 12, "b"), _segment(0, 2, "a"), _segment(20, 22, "c")])
+    assert index.text_between(0, 30) == "a b c"
@@ -0,0 +1,95 @@
+"""
+能量VAD分块的行为测试
+
+合成音频：低电平噪声上的正弦语音段，检查块覆盖全部语音、跳过长静音、互不重叠且不超过最大块长。
+"""
+
+import numpy as np
+import pytest
+
+from app.voice_activity import EnergyVAD
+
+SAMPLE_RATE = 16000
+
+
+def _audio(layout, noise: float = 0.001, seed: int = 0) -> np.ndarray:
+    """layout为 [(秒数, 是否语音)]，语音段是0.3振幅的220Hz正弦"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for seconds, speech in layout:
+        n = int(seconds * SAMPLE_RATE)
+        part = rng.normal(0, noise, n).astype(np.float32)
+        if speech:
+            part += 0.3 * np.sin(2 * np.pi * 220 * np.arange(n) / SAMPLE_RATE).astype(np.float32)
+        parts.append(part)
+    return np.concatenate(parts)
+
+
+def _speech_spans(layout):
+    spans, t = [], 0.0
+    for seconds, speech in layout:
+        if speech:
+            spans.append((t, t + seconds))
+        t += seconds
+    return spans
+
+
+def _assert_well_formed(chunks, total: int, max_chunk: float):
+    assert chunks == sorted(chunks)
+    for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+        assert end <= next_start
+    for start, end in chunks:
+        assert 0 <= start < end <= total
+        assert end - start <= max_chunk * SAMPLE_RATE
+
+
+def _covered(chunks, start: float, end: float) -> bool:
+    return any(s <= start * SAMPLE_RATE and end * SAMPLE_RATE <= e for s, e in chunks)
+
+
+def test_chunks_cover_speech_and_skip_long_silence():
+    layout = [(3, False), (4, True), (20, False), (5, True), (1, False), (2, True), (10, False)]
+    audio = _audio(layout)
+    vad = EnergyVAD(SAMPLE_RATE)
+    chunks = vad.chunks(audio)
+    _assert_well_formed(chunks, len(audio), 30.0)
+    for start, end in _speech_spans(layout):
+        assert _covered(chunks, start, end)
+    # 20秒静音的中间和首尾的静音不在任何块中
+    for silent in (1.0, 17.0, 40.0):
+        assert not _covered(chunks, silent, silent + 0.1)
+    # 间隔1秒（不超过max_gap）的两段语音放在同一块
+    assert len(chunks) == 2
+
+
+def test_long_speech_is_split_at_max_chunk():
+    layout = [(1, False), (75, True), (1, False)]
+    audio = _audio(layout)
+    vad = EnergyVAD(SAMPLE_RATE, max_chunk=20.0)
+    chunks = vad.chunks(audio)
+    _assert_well_formed(chunks, len(audio), 20.0)
+    assert len(chunks) >= 4
+    # 切开的块首尾相接，中间不丢语音
+    for (_, end), (next_start, _) in zip(chunks, chunks[1:]):
+        assert end == next_start
+
+
+@pytest.mark.parametrize("noise", [0.0, 0.001])
+def test_silence_has_no_chunks(noise):
+    audio = _audio([(10, False)], noise=noise)
+    assert EnergyVAD(SAMPLE_RATE).chunks(audio) == []
+
+
+def test_empty_audio():
+    assert EnergyVAD(SAMPLE_RATE).chunks(np.zeros(0, np.float32)) == []
+
+
+def test_short_click_is_ignored():
+    layout = [(3, False), (0.06, True), (3, False)]
+    assert EnergyVAD(SAMPLE_RATE, min_speech=0.2).chunks(_audio(layout)) == []
+
+
+def test_audio_without_pauses_is_one_region():
+    audio = _audio([(12, True)])
+    vad = EnergyVAD(SAMPLE_RATE)
+    assert vad.chunks(audio) == [(0, len(audio))]
@@ -19,7 +19,8 @@ interface VideoSegment {
   scene_type: string
   frame_count: number
   thumbnail_url?: string
-  gif_url?: string
+  gif_url?: string // 片段预览（GIF/WebP/MP4）
+  gif_size?: number
   // 新增AI分析字段
   content_analysis?: {
     caption: string // 文案（旁白或字幕）
@@ -679,7 +680,17 @@ export function AnalysisResult({ id }: { id: string }) {
                           <TableRow key={segment.segment_id} className="hover:bg-gray-50">
                             <TableCell className="p-2">
                               <div className="w-24 h-16 bg-gray-100 rounded-lg overflow-hidden relative group cursor-pointer">
-                                                                 {segment.gif_url ? (
+                                                                 {segment.gif_url?.endsWith('.mp4') ? (
+                                   <video
+                                     src={`http://localhost:8000${segment.gif_url}`}
+                                     poster={segment.thumbnail_url ? `http://localhost:8000${segment.thumbnail_url}` : undefined}
+                                     className="w-full h-full object-cover"
+                                     autoPlay
+                                     loop
+                                     muted
+                                     playsInline
+                                   />
+                                 ) : segment.gif_url ? (
                                    <img 
                                      src={`http://localhost:8000${segment.gif_url}`}
                                      alt={`片段 ${segment.segment_id}`}